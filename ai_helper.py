@@ -1,62 +1,179 @@
 import os
-from dotenv import load_dotenv
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import importlib.util
+import logging
+from utils import load_env
+
+logger = logging.getLogger(__name__)
+
+# List numbering such as "1. " or "2) " in front of generated titles
+_NUM_PREFIX_RE = re.compile(r'^\s*\d+[.)]\s+')
+# Fixed system prompts keep every request's prefix byte-identical, so the
+# provider's automatic prompt caching can reuse it; variable text goes last
+TITLE_SYSTEM_PROMPT = "You are a product title generator for e-commerce. Generate compelling product titles."
+DESCRIPTION_SYSTEM_PROMPT = "You are a product description writer for e-commerce. Write SEO-friendly product descriptions."
+AI_CACHE_FILE = os.path.join('.wc_cache', 'ai.sqlite')
+AI_CACHE_TTL = 30 * 24 * 60 * 60
+
+
+class AICache:
+    """Remember completions by request hash so repeated prompts skip the API"""
+    
+    def __init__(self, db_file=AI_CACHE_FILE, ttl=AI_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._memory = {}
+        os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, content TEXT, created_at REAL)"
+            )
+    
+    @staticmethod
+    def make_key(**params):
+        return hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+    
+    def get(self, key):
+        content = self._memory.get(key)
+        if content is not None:
+            return content
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM completions WHERE key = ? AND created_at > ?",
+                (key, time.time() - self.ttl)
+            ).fetchone()
+        if row:
+            self._memory[key] = row[0]
+            return row[0]
+        return None
+    
+    def put(self, key, content):
+        self._memory[key] = content
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions VALUES (?, ?, ?)",
+                (key, content, time.time())
+            )
 
-load_dotenv()
 
 class AIHelper:
     def __init__(self):
+        load_env()
         self.api_key = os.getenv('OPENAI_API_KEY')
-        self.available = False
+        self._client = None
         
-        if self.api_key:
-            try:
-                import openai
-                openai.api_key = self.api_key
-                self.available = True
-                self.client = openai
-            except ImportError:
-                pass
-    
-    def generate_title(self, prompt, num_titles=3):
-        """Generate product titles using AI"""
+        # Only check that openai is installed, importing it waits until first use
+        self.available = bool(self.api_key) and importlib.util.find_spec('openai') is not None
+        
+        try:
+            self.cache = AICache()
+        except sqlite3.Error as e:
+            logger.warning(f"AI response cache disabled: {e}")
+            self.cache = None
+    
+    @property
+    def client(self):
+        if self._client is None:
+            import openai
+            # One client for the whole app, its connection pool stays warm
+            # between calls
+            self._client = openai.OpenAI(api_key=self.api_key)
+        return self._client
+    
+    def _chat(self, messages, max_tokens, model="gpt-3.5-turbo", temperature=0.7, on_chunk=None,
+              use_cache=True):
+        """
+        Run a chat completion and return its text, cached by request
+        
+        With on_chunk the answer is streamed and each piece of text is passed
+        to it as soon as it arrives. use_cache=False always asks the API (for
+        an explicit regenerate); the new answer still replaces the cached one.
+        """
+        key = AICache.make_key(model=model, messages=messages, max_tokens=max_tokens, temperature=temperature)
+        if self.cache is not None and use_cache:
+            content = self.cache.get(key)
+            if content is not None:
+                logger.info("AI cache hit")
+                if on_chunk:
+                    on_chunk(content)
+                return content
+        
+        if on_chunk:
+            parts = []
+            for chunk in self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                stream=True
+            ):
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_chunk(delta)
+            content = "".join(parts)
+        else:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+            content = response.choices[0].message.content
+        
+        # A blank answer is not worth replaying, the next call asks again
+        if self.cache is not None and content and content.strip():
+            self.cache.put(key, content)
+        return content
+    
+    def generate_title(self, prompt, num_titles=3, regenerate=False):
+        """Generate product titles using AI, regenerate skips cached answers"""
         if not self.available:
             return []
         
         try:
-            response = self.client.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            content = self._chat(
                 messages=[
-                    {"role": "system", "content": "You are a product title generator for e-commerce. Generate compelling product titles."},
+                    {"role": "system", "content": TITLE_SYSTEM_PROMPT},
                     {"role": "user", "content": f"Generate {num_titles} product titles for: {prompt}"}
                 ],
                 max_tokens=100,
-                temperature=0.7
+                use_cache=not regenerate
             )
             
-            titles = response.choices[0].message.content.strip().split('\n')
+            titles = content.strip().split('\n')
             # Clean up the titles
-            titles = [t.split('. ', 1)[1] if '. ' in t else t for t in titles if t.strip()]
+            titles = [_NUM_PREFIX_RE.sub('', t).strip() for t in titles if t.strip()]
             return titles[:num_titles]
         except Exception as e:
             return []
     
-    def generate_description(self, product_title, product_type="product"):
-        """Generate product description using AI"""
+    def generate_description(self, product_title, product_type="product", on_chunk=None, regenerate=False):
+        """Generate product description using AI, optionally streamed to on_chunk"""
         if not self.available:
             return ""
         
         try:
-            response = self.client.ChatCompletion.create(
-                model="gpt-3.5-turbo",
+            content = self._chat(
                 messages=[
-                    {"role": "system", "content": "You are a product description writer for e-commerce. Write SEO-friendly product descriptions."},
+                    {"role": "system", "content": DESCRIPTION_SYSTEM_PROMPT},
                     {"role": "user", "content": f"Write a detailed product description for this {product_type}: {product_title}\nInclude features, benefits, and specifications in a professional tone."}
                 ],
                 max_tokens=300,
-                temperature=0.7
+                on_chunk=on_chunk,
+                use_cache=not regenerate
             )
             
-            description = response.choices[0].message.content.strip()
+            description = content.strip()
             return description
         except Exception as e:
-            return ""
\ No newline at end of file
+            return ""
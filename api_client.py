@@ -1,106 +1,552 @@
 import os
+import json
+import time
+import gzip
+import sqlite3
+import hashlib
+import threading
 import requests
 import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
-from dotenv import load_dotenv
 import logging
+from utils import retry, load_env
 
-load_dotenv()
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+RETRY_EXCEPTIONS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+# Creates (products, media) are not idempotent: only retry when the request never reached the server
+CREATE_RETRY_EXCEPTIONS = (requests.exceptions.ConnectTimeout,)
+
+
+def create_is_retryable(response):
+    """Responses that guarantee a create was not applied: 429, or 503 with Retry-After"""
+    if response.status_code == 429:
+        return True
+    return response.status_code == 503 and 'Retry-After' in response.headers
+
+
+def json_loads(data):
+    """Decode JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def json_dumps(obj):
+    """Encode an object to JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+CATEGORY_CACHE_FILE = os.path.join('.wc_cache', 'categories.json')
+CATEGORY_CACHE_TTL = 24 * 60 * 60  # Categories rarely change, refresh once a day
+MEDIA_CACHE_FILE = os.path.join('.wc_cache', 'media.sqlite')
+MEDIA_CACHE_TTL = 30 * 24 * 60 * 60
+
+GZIP_MIN_BODY_SIZE = 2048
+# WooCommerce rejects batch requests with more than 100 objects
+PRODUCT_BATCH_SIZE = 100
+
+IMAGE_MIME_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+    '.bmp': 'image/bmp',
+    '.tiff': 'image/tiff',
+}
 
 logger = logging.getLogger(__name__)
 
+# Quota headers sent by WordPress/WooCommerce rate limiting plugins
+RATE_LIMIT_REMAINING_HEADERS = ('X-WP-RateLimit-Remaining', 'X-RateLimit-Remaining', 'RateLimit-Remaining')
+RATE_LIMIT_RESET_HEADERS = ('X-WP-RateLimit-Reset', 'X-RateLimit-Reset', 'RateLimit-Reset')
+
+
+def _header_number(response, names):
+    """First numeric value among the given response headers, or None"""
+    for name in names:
+        value = response.headers.get(name)
+        if value is not None:
+            try:
+                return float(value)
+            except ValueError:
+                continue
+    return None
+
+
+class RateLimiter:
+    """Token bucket pacing with AIMD adaptation to HTTP 429 responses"""
+    
+    def __init__(self, rps=2.0, min_rps=0.2, max_rps=10.0, additive_step=0.25,
+                 success_threshold=5, state_file='rate_limit_state.json', burst=25):
+        self.min_rps = min_rps
+        self.max_rps = max_rps
+        self.additive_step = additive_step
+        self.success_threshold = success_threshold
+        self.state_file = state_file
+        self.rps = self._load_rps(rps)
+        # Up to `burst` requests go out back to back, then the bucket refills at rps
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill_ts = time.monotonic()
+        self.blocked_until = 0.0
+        self.consecutive_successes = 0
+        self._lock = threading.Lock()
+    
+    def _load_rps(self, default):
+        """Start from the last known good rate if one was saved"""
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                rps = float(json.load(f).get('rps', default))
+            return min(self.max_rps, max(self.min_rps, rps))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return default
+    
+    def _save_rps(self):
+        try:
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump({'rps': self.rps}, f)
+        except OSError as e:
+            logger.warning(f"Could not save rate limit state: {e}")
+    
+    def wait(self):
+        """Block until the next request is allowed to go out"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill_ts) * self.rps)
+            self.last_refill_ts = now
+            # Take the token before sleeping, a negative balance queues other threads behind it
+            self.tokens -= 1
+            delay = max(0.0, -self.tokens / self.rps, self.blocked_until - now)
+        if delay:
+            time.sleep(delay)
+    
+    def update(self, response, batch_size=1):
+        """Adapt the rate to the server's answer"""
+        with self._lock:
+            if response.status_code == 429:
+                # Larger batches cost the server more, so back off harder
+                self.rps = max(self.min_rps, self.rps * 0.5 / max(1, batch_size) ** 0.5)
+                self.consecutive_successes = 0
+                self.tokens = min(self.tokens, 0.0)
+                retry_after = response.headers.get('Retry-After')
+                try:
+                    self.blocked_until = time.monotonic() + float(retry_after)
+                except (TypeError, ValueError):
+                    pass
+                logger.warning(f"Rate limited by server, slowing down to {self.rps:.2f} req/s")
+                self._save_rps()
+            elif response.status_code < 400:
+                self._apply_quota_headers(response)
+                self.consecutive_successes += 1
+                if self.consecutive_successes >= self.success_threshold:
+                    self.consecutive_successes = 0
+                    if self.rps < self.max_rps:
+                        self.rps = min(self.max_rps, self.rps + self.additive_step)
+                        self._save_rps()
+    
+    def _apply_quota_headers(self, response):
+        """Never spend more tokens than the server says are left"""
+        remaining = _header_number(response, RATE_LIMIT_REMAINING_HEADERS)
+        if remaining is None:
+            return
+        self.tokens = min(self.tokens, remaining)
+        if remaining <= 0:
+            reset = _header_number(response, RATE_LIMIT_RESET_HEADERS)
+            if reset is not None:
+                # Some servers send an epoch timestamp, others seconds to wait
+                if reset > 1e9:
+                    reset -= time.time()
+                self.blocked_until = max(self.blocked_until, time.monotonic() + max(0.0, reset))
+
+
+def create_session(auth):
+    """Create a session that keeps connections alive between requests"""
+    session = requests.Session()
+    session.auth = auth
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=64, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
 class WooCommerceAPI:
     def __init__(self):
+        load_env()
         self.store_url = os.getenv('STORE_URL')
         self.consumer_key = os.getenv('WC_CONSUMER_KEY')
         self.consumer_secret = os.getenv('WC_CONSUMER_SECRET')
         self.api_base = f"{self.store_url}/wp-json/wc/v3"
+        self.rate_limiter = RateLimiter()
+        self.session = create_session(HTTPBasicAuth(self.consumer_key, self.consumer_secret))
+        self._categories_cache = None
+        # Only enable if the web server decodes gzip request bodies
+        self.compress_requests = os.getenv('WC_GZIP_REQUESTS', '').lower() in ('1', 'true', 'yes')
         
     def test_connection(self):
         """Test connection to WooCommerce API"""
         try:
-            response = requests.get(
+            self.rate_limiter.wait()
+            response = self.session.get(
                 f"{self.api_base}/products",
-                auth=HTTPBasicAuth(self.consumer_key, self.consumer_secret),
-                params={'per_page': 1},
+                # Only the id keeps the probe response tiny
+                params={'per_page': 1, '_fields': 'id'},
                 timeout=10
             )
+            self.rate_limiter.update(response)
             return response.status_code == 200
         except Exception as e:
             logger.error(f"Connection test failed: {e}")
             return False
     
-    def get_categories(self):
+    def _get_categories_page(self, page, per_page=100):
+        self.rate_limiter.wait()
+        response = self.session.get(
+            f"{self.api_base}/products/categories",
+            params={
+                'per_page': per_page,
+                'page': page,
+                'hide_empty': False
+            },
+            timeout=10
+        )
+        self.rate_limiter.update(response)
+        return response
+    
+    def _load_cached_categories(self, max_age=CATEGORY_CACHE_TTL):
+        """Return categories from the disk cache if it is fresh and for this store"""
+        try:
+            if max_age is not None and time.time() - os.path.getmtime(CATEGORY_CACHE_FILE) > max_age:
+                return None
+            with open(CATEGORY_CACHE_FILE, 'rb') as f:
+                cached = json_loads(f.read())
+            if cached.get('store_url') != self.store_url:
+                return None
+            return cached.get('categories')
+        except (OSError, ValueError, AttributeError):
+            return None
+    
+    def get_cached_categories(self):
+        """Return (categories, is_fresh) from the disk cache, stale entries included"""
+        categories = self._load_cached_categories(max_age=None)
+        if not categories:
+            return None, False
+        try:
+            fresh = time.time() - os.path.getmtime(CATEGORY_CACHE_FILE) <= CATEGORY_CACHE_TTL
+        except OSError:
+            fresh = False
+        return categories, fresh
+    
+    def _save_cached_categories(self, categories):
+        try:
+            os.makedirs(os.path.dirname(CATEGORY_CACHE_FILE), exist_ok=True)
+            tmp_file = f"{CATEGORY_CACHE_FILE}.tmp"
+            with open(tmp_file, 'wb') as f:
+                f.write(json_dumps({'store_url': self.store_url, 'categories': categories}))
+            os.replace(tmp_file, CATEGORY_CACHE_FILE)
+        except OSError as e:
+            logger.warning(f"Could not write categories cache: {e}")
+    
+    def invalidate_categories_cache(self):
+        """Forget cached categories, e.g. after creating a new category"""
+        self._categories_cache = None
+        try:
+            os.remove(CATEGORY_CACHE_FILE)
+        except OSError:
+            pass
+    
+    def get_categories(self, use_cache=True):
         """Retrieve all categories and subcategories"""
+        if use_cache:
+            if self._categories_cache is None:
+                self._categories_cache = self._load_cached_categories()
+            if self._categories_cache is not None:
+                return self._categories_cache
+        
+        categories = self._fetch_categories()
+        if categories:
+            self._categories_cache = categories
+            self._save_cached_categories(categories)
+        return categories
+    
+    def _fetch_categories(self):
+        """Download all categories from the store"""
         try:
-            categories = []
-            page = 1
-            per_page = 100
+            response = self._get_categories_page(1)
+            if response.status_code != 200:
+                return []
+            categories = json_loads(response.content)
             
-            while True:
-                response = requests.get(
-                    f"{self.api_base}/products/categories",
-                    auth=HTTPBasicAuth(self.consumer_key, self.consumer_secret),
-                    params={
-                        'per_page': per_page,
-                        'page': page,
-                        'hide_empty': False
-                    },
-                    timeout=10
-                )
-                
-                if response.status_code == 200:
-                    batch = response.json()
-                    categories.extend(batch)
-                    
-                    if len(batch) < per_page:
-                        break
-                    page += 1
-                else:
-                    break
+            # The first page tells us how many pages exist, fetch the rest at once
+            try:
+                total_pages = int(response.headers.get('X-WP-TotalPages', 1))
+            except ValueError:
+                total_pages = 1
+            
+            if total_pages > 1:
+                with ThreadPoolExecutor(max_workers=min(8, total_pages - 1)) as executor:
+                    responses = executor.map(self._get_categories_page, range(2, total_pages + 1))
+                    for response in responses:
+                        if response.status_code != 200:
+                            break
+                        categories.extend(json_loads(response.content))
             
             return categories
         except Exception as e:
             logger.error(f"Failed to get categories: {e}")
             return []
     
+    def _post_json(self, endpoint, payload, batch_size=1, timeout=30):
+        """POST a JSON body to the store API, paced by the rate limiter"""
+        body = json_dumps(payload)
+        headers = {'Content-Type': 'application/json'}
+        if self.compress_requests and len(body) > GZIP_MIN_BODY_SIZE:
+            # Long descriptions compress well; level 1 is plenty for bandwidth
+            body = gzip.compress(body, compresslevel=1)
+            headers['Content-Encoding'] = 'gzip'
+        
+        self.rate_limiter.wait()
+        response = self.session.post(
+            f"{self.api_base}/{endpoint}",
+            data=body,
+            headers=headers,
+            timeout=timeout
+        )
+        self.rate_limiter.update(response, batch_size=batch_size)
+        return response
+    
+    @retry(retry_exceptions=CREATE_RETRY_EXCEPTIONS, retry_response=create_is_retryable)
+    def _post_product(self, product_data):
+        """POST a single product, paced by the rate limiter"""
+        return self._post_json("products", product_data)
+    
+    @retry(retry_exceptions=CREATE_RETRY_EXCEPTIONS, retry_response=create_is_retryable)
+    def _post_products_batch(self, products):
+        """POST up to PRODUCT_BATCH_SIZE product creates in one request"""
+        # The server creates every product before answering, allow for it
+        return self._post_json(
+            "products/batch", {'create': products},
+            batch_size=len(products), timeout=30 + len(products)
+        )
+    
     def create_product(self, product_data):
         """Create a new product in WooCommerce"""
         try:
-            response = requests.post(
-                f"{self.api_base}/products",
-                auth=HTTPBasicAuth(self.consumer_key, self.consumer_secret),
-                json=product_data,
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
+            response = self._post_product(product_data)
             
             return {
                 'success': response.status_code == 201,
                 'status_code': response.status_code,
-                'data': response.json() if response.status_code == 201 else response.text,
+                'data': json_loads(response.content) if response.status_code == 201 else response.text,
                 'product_data': product_data
             }
         except Exception as e:
             logger.error(f"Failed to create product: {e}")
             return {'success': False, 'error': str(e)}
+    
+    def create_products_batch(self, products):
+        """Create products through the batch endpoint, one result per product in input order"""
+        results = []
+        for start in range(0, len(products), PRODUCT_BATCH_SIZE):
+            chunk = products[start:start + PRODUCT_BATCH_SIZE]
+            try:
+                response = self._post_products_batch(chunk)
+                if response.status_code != 200:
+                    results.extend({
+                        'success': False,
+                        'status_code': response.status_code,
+                        'error': response.text,
+                        'product_data': product_data
+                    } for product_data in chunk)
+                    continue
+                
+                created = json_loads(response.content).get('create', [])
+                for product_data, item in zip(chunk, created):
+                    # Failed items come back as {'id': 0, 'error': {...}}
+                    error = item.get('error')
+                    result = {
+                        'success': error is None,
+                        'status_code': response.status_code,
+                        'product_data': product_data
+                    }
+                    if error is None:
+                        result['data'] = item
+                    else:
+                        result['error'] = error.get('message', str(error))
+                        result['error_code'] = error.get('code', '')
+                    results.append(result)
+                # A short response leaves the remaining products unaccounted for
+                results.extend({
+                    'success': False,
+                    'error': 'Missing from batch response',
+                    'product_data': product_data
+                } for product_data in chunk[len(created):])
+            except Exception as e:
+                logger.error(f"Failed to create product batch: {e}")
+                results.extend({'success': False, 'error': str(e), 'product_data': product_data}
+                               for product_data in chunk)
+        return results
+
+
+def default_upload_concurrency():
+    """Cap concurrent uploads well below the process file descriptor limit"""
+    try:
+        import resource
+        soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    except (ImportError, ValueError, OSError):
+        return 64  # No resource module on Windows
+    if soft_limit == resource.RLIM_INFINITY:
+        return 256
+    return max(1, min(256, soft_limit // 4))
+
+
+class MediaCache:
+    """Remember uploaded images by content hash so duplicates are not re-uploaded"""
+    
+    def __init__(self, db_file=MEDIA_CACHE_FILE, ttl=MEDIA_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_file) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS media ("
+                "store_url TEXT, hash TEXT, media_id INTEGER, source_url TEXT, uploaded_at REAL, "
+                "PRIMARY KEY (store_url, hash))"
+            )
+    
+    @staticmethod
+    def file_hash(image_path):
+        with open(image_path, 'rb') as f:
+            if hasattr(hashlib, 'file_digest'):
+                # file_digest (3.11+) reads into one reused buffer instead of a bytes object per chunk
+                return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+            h = hashlib.blake2b(digest_size=16)
+            while chunk := f.read(1 << 20):
+                h.update(chunk)
+            return h.hexdigest()
+    
+    def get(self, store_url, file_hash):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT media_id, source_url FROM media "
+                "WHERE store_url = ? AND hash = ? AND uploaded_at > ?",
+                (store_url, file_hash, time.time() - self.ttl)
+            ).fetchone()
+        if row:
+            return {'success': True, 'id': row[0], 'url': row[1]}
+        return None
+    
+    def put(self, store_url, file_hash, media_id, source_url):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO media VALUES (?, ?, ?, ?, ?)",
+                (store_url, file_hash, media_id, source_url, time.time())
+            )
+    
+    def invalidate(self, store_url, media_id):
+        """Drop a media id that no longer exists on the store"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM media WHERE store_url = ? AND media_id = ?",
+                (store_url, media_id)
+            )
 
 
 class WordPressMediaAPI:
     def __init__(self):
+        load_env()
         self.store_url = os.getenv('STORE_URL')
         self.username = os.getenv('WP_USERNAME')
         self.password = os.getenv('WP_APP_PASSWORD')
+        self.session = create_session(HTTPBasicAuth(self.username, self.password))
+        # Each in-flight upload holds a file and a socket open
+        self._upload_slots = threading.BoundedSemaphore(default_upload_concurrency())
+        try:
+            self.media_cache = MediaCache()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Media cache disabled: {e}")
+            self.media_cache = None
+        # Hashes being uploaded right now, so a duplicate waits instead of uploading again
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+    
+    def forget_media(self, media_id):
+        """Drop a media id the store no longer has, so its image is uploaded again"""
+        if self.media_cache is not None:
+            self.media_cache.invalidate(self.store_url, media_id)
+    
+    # Each POST creates an attachment, so it gets the same create-safe retries as products
+    @retry(retry_exceptions=CREATE_RETRY_EXCEPTIONS, retry_response=create_is_retryable)
+    def _post_media(self, media_url, headers, image_path):
+        # Reopen on every attempt so a retry streams the file from the start
+        with self._upload_slots, open(image_path, 'rb') as img_file:
+            return self.session.post(
+                media_url,
+                headers=headers,
+                data=img_file,  # Streamed in chunks, original binary data
+                timeout=30
+            )
     
     def upload_media(self, image_path):
         """Upload image to WordPress media library with full quality"""
+        if self.media_cache is None:
+            return self._upload_new_media(image_path, None)
+        
+        try:
+            # Skip the upload entirely if this exact file was sent before
+            file_hash = self.media_cache.file_hash(image_path)
+            cached = self.media_cache.get(self.store_url, file_hash)
+            if cached:
+                logger.info(f"Reusing uploaded media {cached['id']} for {image_path}")
+                return cached
+        except OSError as e:
+            logger.warning(f"Image not found or inaccessible: {image_path}: {e}")
+            return {'success': False, 'error': str(e)}
+        except Exception as e:
+            logger.error(f"Media upload exception: {e}")
+            return {'success': False, 'error': str(e)}
+        
+        with self._inflight_lock:
+            pending = self._inflight.get(file_hash)
+            if pending is None:
+                self._inflight[file_hash] = threading.Event()
+        
+        if pending is not None:
+            # Same image in another product of this run, reuse its upload
+            pending.wait()
+            cached = self.media_cache.get(self.store_url, file_hash)
+            if cached:
+                logger.info(f"Reusing uploaded media {cached['id']} for {image_path}")
+                return cached
+            return self._upload_new_media(image_path, file_hash)
+        
+        try:
+            return self._upload_new_media(image_path, file_hash)
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(file_hash).set()
+    
+    def _upload_new_media(self, image_path, file_hash):
+        """Upload an image that is not in the media cache, recording it there on success"""
+        try:
+            # Paths are not checked before queueing, a missing file surfaces here
+            file_size = os.path.getsize(image_path)
+        except OSError as e:
+            logger.warning(f"Image not found or inaccessible: {image_path}: {e}")
+            return {'success': False, 'error': str(e)}
+        
         try:
-            # Read image in binary mode (no compression, full quality)
-            with open(image_path, 'rb') as img_file:
-                img_data = img_file.read()
-            
             filename = os.path.basename(image_path)
-            mime_type, _ = mimetypes.guess_type(image_path)
+            mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(filename)[1].lower())
+            if not mime_type:
+                mime_type, _ = mimetypes.guess_type(image_path)
             if not mime_type:
                 mime_type = 'image/jpeg'
             
@@ -108,19 +554,17 @@ class WordPressMediaAPI:
             
             headers = {
                 'Content-Disposition': f'attachment; filename="{filename}"',
-                'Content-Type': mime_type
+                'Content-Type': mime_type,
+                'Content-Length': str(file_size)
             }
             
-            response = requests.post(
-                media_url,
-                headers=headers,
-                data=img_data,  # Send original binary data
-                auth=HTTPBasicAuth(self.username, self.password),
-                timeout=30
-            )
+            # Upload the file as-is (no compression, full quality)
+            response = self._post_media(media_url, headers, image_path)
             
             if response.status_code in [200, 201]:
-                media_data = response.json()
+                media_data = json_loads(response.content)
+                if file_hash:
+                    self.media_cache.put(self.store_url, file_hash, media_data['id'], media_data['source_url'])
                 return {
                     'success': True,
                     'id': media_data['id'],
@@ -1,17 +1,21 @@
 import os
-import glob
-import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
+from utils import PRICE_DELETE_TABLE, IMAGE_EXTENSIONS, is_image_name, count_images
 import logging
 
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
 logger = logging.getLogger(__name__)
 
 class BulkProductProcessor:
-    def __init__(self):
-        self.supported_image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff']
+    supported_image_extensions = IMAGE_EXTENSIONS
     
-    def scan_directory(self, directory_path: str) -> List[Dict[str, Any]]:
+    def scan_directory(self, directory_path: str, max_workers: int = None) -> List[Dict[str, Any]]:
         """
         Scan a directory for product folders and extract product data
         
@@ -27,54 +31,82 @@ class BulkProductProcessor:
         │       └── image2.jpg
         ├── ProductFolder2/
         └── ...
+        
+        See iter_products to consume products as they are scanned.
+        """
+        # With the whole batch in hand, clean all prices in one vectorized pass
+        products = list(self.iter_products(directory_path, max_workers, validate_prices=pd is None))
+        if pd is not None:
+            self._validate_prices_vectorized(products)
+        return products
+    
+    def iter_products(self, directory_path: str, max_workers: int = None,
+                      validate_prices: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Yield product data for each product folder, in folder listing order
+        
+        Folders are processed in parallel; raise max_workers for slow
+        network shares. With validate_prices=False the raw price text is
+        kept so the caller can clean it in bulk.
         """
-        products = []
         scanned_count = 0
         error_count = 0
         
         try:
-            directory = Path(directory_path)
-            
             # Check if directory exists
-            if not directory.exists():
+            if not os.path.isdir(directory_path):
                 raise FileNotFoundError(f"Directory not found: {directory_path}")
             
-            # Iterate through all subdirectories (product folders)
-            for item in directory.iterdir():
-                if item.is_dir():
-                    product_data = self._process_product_folder(item)
+            # List all subdirectories (product folders) in one pass;
+            # DirEntry caches the file type so no extra stat per item
+            with os.scandir(directory_path) as entries:
+                folders = [item for item in entries if item.is_dir()]
+            
+            # Folder processing is pure I/O, so threads overlap the waits
+            if max_workers is None:
+                max_workers = (os.cpu_count() or 1) + 4
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # map yields in folder order, so preview, export and upload order are stable
+                results = executor.map(
+                    lambda item: self._process_product_folder(Path(item.path), validate_prices),
+                    folders
+                )
+                for item, product_data in zip(folders, results):
                     if product_data:
-                        products.append(product_data)
                         scanned_count += 1
+                        yield product_data
                     else:
                         error_count += 1
                         logger.warning(f"Failed to process product folder: {item.name}")
             
             logger.info(f"Scanned {scanned_count} products, {error_count} errors")
-            return products
             
         except Exception as e:
             logger.error(f"Error scanning directory: {e}")
             raise
     
-    def _process_product_folder(self, folder_path: Path) -> Dict[str, Any]:
+    def _process_product_folder(self, folder_path: Path, validate_price: bool = True) -> Dict[str, Any]:
         """Process a single product folder"""
         try:
             folder_name = folder_path.name
             
+            # List the folder once instead of probing each file separately;
+            # names are matched case-insensitively like the filesystem on Windows
+            with os.scandir(folder_path) as entries:
+                entries_by_name = {entry.name.lower(): entry for entry in entries}
+            
             # Check required files
             required_files = ['title.txt', 'description.txt', 'price.txt']
             for file_name in required_files:
-                file_path = folder_path / file_name
-                if not file_path.exists():
+                if file_name not in entries_by_name:
                     logger.warning(f"Missing required file {file_name} in {folder_name}")
                     return None
             
             # Read text files
-            title = self._read_text_file(folder_path / 'title.txt')
-            description = self._read_text_file(folder_path / 'description.txt')
-            price = self._read_text_file(folder_path / 'price.txt')
-            sku = self._read_text_file(folder_path / 'sku.txt') if (folder_path / 'sku.txt').exists() else ""
+            title = self._read_text_file(entries_by_name['title.txt'].path)
+            description = self._read_text_file(entries_by_name['description.txt'].path)
+            price = self._read_text_file(entries_by_name['price.txt'].path)
+            sku = self._read_text_file(entries_by_name['sku.txt'].path) if 'sku.txt' in entries_by_name else ""
             
             # Validate required fields
             if not title or not price:
@@ -82,20 +114,20 @@ class BulkProductProcessor:
                 return None
             
             # Process images
-            images_folder = folder_path / 'images'
+            images_entry = entries_by_name.get('images')
             images = []
-            if images_folder.exists() and images_folder.is_dir():
-                images = self._get_images_from_folder(images_folder)
+            if images_entry is not None and images_entry.is_dir():
+                images = self._get_images_from_folder(Path(images_entry.path))
             else:
                 # Try to find images directly in the product folder
-                images = self._find_images_in_folder(folder_path)
+                images = self._find_images_in_folder(folder_path, entries_by_name.values())
             
             # Create product data dictionary
             product_data = {
                 'folder_name': folder_name,
                 'title': title.strip(),
                 'description': description.strip(),
-                'price': self._validate_price(price.strip()),
+                'price': self._validate_price(price.strip()) if validate_price else price.strip(),
                 'sku': sku.strip() if sku else "",
                 'images': images,
                 'has_images': len(images) > 0,
@@ -113,9 +145,21 @@ class BulkProductProcessor:
     def _read_text_file(self, file_path: Path) -> str:
         """Read content from a text file"""
         try:
-            if file_path.exists():
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
+            # The product files are tiny, so read them with raw os calls
+            # instead of going through the buffered text reader; CRLF and
+            # bare CR are normalized like universal-newline reading
+            fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+            try:
+                chunks = []
+                while True:
+                    chunk = os.read(fd, 8192)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            finally:
+                os.close(fd)
+            return b''.join(chunks).decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        except FileNotFoundError:
             return ""
         except Exception as e:
             logger.error(f"Error reading file {file_path}: {e}")
@@ -125,11 +169,15 @@ class BulkProductProcessor:
         """Get all images from an images folder"""
         images = []
         try:
-            # Search for images recursively
-            for ext in self.supported_image_extensions:
-                pattern = f"*{ext}"
-                for image_path in images_folder.rglob(pattern):
-                    images.append(str(image_path))
+            # Search for images recursively with one scandir per directory
+            pending = [str(images_folder)]
+            while pending:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending.append(entry.path)
+                        elif self._is_image_name(entry.name) and entry.is_file():
+                            images.append(entry.path)
             
             # Sort images for consistency (optional: sort by name)
             images.sort()
@@ -139,14 +187,17 @@ class BulkProductProcessor:
             logger.error(f"Error getting images from {images_folder}: {e}")
             return []
     
-    def _find_images_in_folder(self, folder_path: Path) -> List[str]:
+    def _find_images_in_folder(self, folder_path: Path, entries=None) -> List[str]:
         """Find images directly in the product folder"""
         images = []
         try:
-            for ext in self.supported_image_extensions:
-                pattern = f"*{ext}"
-                for image_path in folder_path.glob(pattern):
-                    images.append(str(image_path))
+            if entries is None:
+                with os.scandir(folder_path) as it:
+                    entries = list(it)
+            
+            for entry in entries:
+                if self._is_image_name(entry.name) and entry.is_file():
+                    images.append(entry.path)
             
             # Sort by filename
             images.sort()
@@ -156,12 +207,19 @@ class BulkProductProcessor:
             logger.error(f"Error finding images in {folder_path}: {e}")
             return []
     
+    def _is_image_name(self, file_name: str) -> bool:
+        """Check if a file name has a supported image extension"""
+        return is_image_name(file_name)
+    
     def _validate_price(self, price_str: str) -> str:
         """Validate and format price"""
         try:
-            # Remove any currency symbols and whitespace
-            import re
-            cleaned = re.sub(r'[^\d.]', '', price_str)
+            # Well-formatted prices need no cleaning
+            if price_str.replace('.', '', 1).isdecimal():
+                cleaned = price_str
+            else:
+                # Remove any currency symbols and whitespace
+                cleaned = price_str.translate(PRICE_DELETE_TABLE)
             if not cleaned:
                 return "0"
             
@@ -175,6 +233,18 @@ class BulkProductProcessor:
         except ValueError:
             return "0"
     
+    def _validate_prices_vectorized(self, products: List[Dict[str, Any]]):
+        """Same rules as _validate_price, applied to a whole batch with pandas"""
+        if not products:
+            return
+        
+        raw = pd.Series([p['price'] for p in products], dtype='string')
+        numeric = pd.to_numeric(raw.str.replace(r'[^\d.]', '', regex=True), errors='coerce')
+        formatted = numeric.map('{:.2f}'.format, na_action='ignore').astype(object)
+        for product, value, price in zip(products, raw, formatted):
+            # to_numeric only reads ASCII digits, the rest (e.g. Arabic-Indic) takes the scalar path
+            product['price'] = self._validate_price(value) if pd.isna(price) else price
+    
     def validate_products(self, products: List[Dict[str, Any]]) -> Dict[str, Any]:
         """Validate a list of products and return statistics"""
         stats = {
@@ -183,6 +253,7 @@ class BulkProductProcessor:
             'invalid': 0,
             'with_images': 0,
             'without_images': 0,
+            'total_images': 0,
             'errors': []
         }
         
@@ -201,6 +272,7 @@ class BulkProductProcessor:
                 continue
             
             # Check if product has images (warning, not error)
+            stats['total_images'] += product.get('image_count', 0)
             if product.get('has_images'):
                 stats['with_images'] += 1
             else:
@@ -225,30 +297,34 @@ class BulkProductProcessor:
                 # Write header
                 writer.writerow(['Folder', 'Title', 'SKU', 'Price', 'Images', 'Status'])
                 
-                # Write data
-                for product in products:
-                    writer.writerow([
+                # Write data, letting the csv module drive the loop
+                rows = (
+                    (
                         product.get('folder_name', ''),
                         product.get('title', ''),
                         product.get('sku', ''),
                         product.get('price', ''),
                         product.get('image_count', 0),
                         product.get('status', 'pending')
-                    ])
+                    )
+                    for product in products
+                )
+                writer.writerows(rows)
             
             logger.info(f"Exported {len(products)} products to {output_file}")
+            return True
             
         except Exception as e:
             logger.error(f"Error exporting to CSV: {e}")
+            return False
     
     def create_batch_summary(self, products: List[Dict[str, Any]]) -> str:
         """Create a summary of the batch"""
         if not products:
             return "No products found"
         
-        total_images = sum(p.get('image_count', 0) for p in products)
-        with_images = sum(1 for p in products if p.get('has_images'))
-        without_images = sum(1 for p in products if not p.get('has_images'))
+        total_images, with_images = count_images(products)
+        without_images = len(products) - with_images
         
         summary = f"""
         📦 BATCH SUMMARY
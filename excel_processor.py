@@ -1,15 +1,36 @@
 import pandas as pd
 import os
+import re
+import stat
 import glob
-from pathlib import Path
-from typing import List, Dict, Any, Tuple
+import fnmatch
+import functools
+import itertools
+import importlib.util
+from typing import List, Dict, Any, Tuple, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from utils import PRICE_DELETE_TABLE, IMAGE_EXTENSIONS, is_image_name
 import logging
 
 logger = logging.getLogger(__name__)
 
+_PRICE_CLEAN_RE = re.compile(r'[^\d.]')
+
 class ExcelProductProcessor:
+    supported_image_extensions = IMAGE_EXTENSIONS
+    required_columns = ('title', 'description', 'price', 'images_path')
+    # Required columns plus the optional sku, other columns are never read
+    excel_columns = frozenset(required_columns + ('sku',))
+    
     def __init__(self):
-        self.supported_image_extensions = ['.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff']
+        # Many rows often point at the same folder, list each one only once per file
+        self._cached_directory_images = functools.lru_cache(maxsize=4096)(self._list_directory_images)
+        # Per-file memo of resolved images_path cells and parent folder listings
+        self._path_cache = {}
+        self._parent_listing_cache = {}
+        # validate_excel_file samples keyed by (path, mtime, size)
+        self._probe_cache = {}
+        self.last_stats = {}
     
     def read_excel_file(self, excel_path: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
@@ -23,33 +44,66 @@ class ExcelProductProcessor:
         - images_path
         
         Returns: (list of products, stats dictionary)
+        
+        See iter_products to consume products without building the list.
+        """
+        products = list(self.iter_products(excel_path))
+        return products, self.last_stats
+    
+    def iter_products(self, excel_path: str, chunk_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Yield product data for each valid Excel row
+        
+        Stats are collected in self.last_stats and are complete once the
+        generator is exhausted.
         """
-        products = []
         stats = {
             'total_rows': 0,
             'valid_products': 0,
             'invalid_products': 0,
             'products_with_images': 0,
             'products_without_images': 0,
+            'total_images': 0,
             'errors': [],
             'columns_found': [],
             'columns_missing': []
         }
+        self.last_stats = stats
         
         try:
             # Read the Excel file
             logger.info(f"Reading Excel file: {excel_path}")
             
-            # Try different engines for different file formats
+            # Folders may have changed since the last file was loaded
+            self._cached_directory_images.cache_clear()
+            self._path_cache = {}
+            self._parent_listing_cache = {}
+            
+            # A validate_excel_file probe of this exact file version already
+            # has the headers, a sheet missing columns is never fully parsed
+            probe = self._probe_cache.get(self._file_key(excel_path))
+            if probe is not None:
+                missing = self._missing_columns(probe.columns)
+                if missing:
+                    stats['columns_found'] = list(probe.columns)
+                    stats['columns_missing'] = missing
+                    error_msg = f"Missing required columns: {', '.join(missing)}"
+                    logger.error(error_msg)
+                    stats['errors'].append(error_msg)
+                    return
+            
             try:
-                df = pd.read_excel(excel_path, engine='openpyxl')
-            except:
-                try:
-                    df = pd.read_excel(excel_path, engine='xlrd')
-                except Exception as e:
-                    logger.error(f"Failed to read Excel file: {e}")
-                    stats['errors'].append(f"Failed to read Excel file: {str(e)}")
-                    return [], stats
+                # Skip unrelated columns and pandas' type inference, every
+                # field is treated as text anyway
+                df = self._load_dataframe(
+                    excel_path,
+                    usecols=lambda name: str(name).strip().lower() in self.excel_columns,
+                    dtype=str
+                )
+            except Exception as e:
+                logger.error(f"Failed to read Excel file: {e}")
+                stats['errors'].append(f"Failed to read Excel file: {str(e)}")
+                return
             
             stats['total_rows'] = len(df)
             logger.info(f"Found {stats['total_rows']} rows in Excel file")
@@ -58,54 +112,134 @@ class ExcelProductProcessor:
             df.columns = df.columns.str.strip().str.lower()
             
             # Check for required columns
-            required_columns = ['title', 'description', 'price', 'images_path']
-            optional_columns = ['sku']
-            
             stats['columns_found'] = list(df.columns)
-            stats['columns_missing'] = [col for col in required_columns if col not in df.columns]
+            stats['columns_missing'] = self._missing_columns(df.columns)
             
             if stats['columns_missing']:
                 error_msg = f"Missing required columns: {', '.join(stats['columns_missing'])}"
                 logger.error(error_msg)
                 stats['errors'].append(error_msg)
-                return [], stats
-            
-            # Process each row
-            for index, row in df.iterrows():
-                try:
-                    product_data = self._process_excel_row(row, index + 2)  # +2 for header and 1-based index
-                    if product_data:
-                        products.append(product_data)
-                        stats['valid_products'] += 1
-                        if product_data.get('has_images'):
-                            stats['products_with_images'] += 1
-                        else:
-                            stats['products_without_images'] += 1
-                    else:
-                        stats['invalid_products'] += 1
-                        stats['errors'].append(f"Row {index + 2}: Failed to process")
-                        
-                except Exception as e:
-                    stats['invalid_products'] += 1
-                    stats['errors'].append(f"Row {index + 2}: Error - {str(e)}")
-                    logger.error(f"Error processing row {index + 2}: {e}")
+                return
+            
+            # Clean all fields column by column, then only the image lookup is per row
+            cleaned = self._vectorized_clean(df)
+            del df
+            
+            rows = zip(
+                cleaned['title'], cleaned['description'], cleaned['price_str'],
+                cleaned['price'], cleaned['sku'], cleaned['images_path']
+            )
+            
+            with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+                row_num = 2  # +2 for header and 1-based index
+                while chunk := list(itertools.islice(rows, chunk_size)):
+                    # Resolve images for the usable rows of a chunk at once; the
+                    # lookups are pure filesystem I/O so threads overlap the waits
+                    lookup_paths = [
+                        images_path if title and price_str else ""
+                        for title, _, price_str, _, _, images_path in chunk
+                    ]
+                    resolved_images = executor.map(self._get_images_from_path, lookup_paths)
+                    
+                    # Process each row
+                    for row, images in zip(chunk, resolved_images):
+                        try:
+                            product_data = self._process_excel_row(*row, images, row_num)
+                            if product_data:
+                                stats['valid_products'] += 1
+                                stats['total_images'] += product_data.get('image_count', 0)
+                                if product_data.get('has_images'):
+                                    stats['products_with_images'] += 1
+                                else:
+                                    stats['products_without_images'] += 1
+                                yield product_data
+                            else:
+                                stats['invalid_products'] += 1
+                                stats['errors'].append(f"Row {row_num}: Failed to process")
+                                
+                        except Exception as e:
+                            stats['invalid_products'] += 1
+                            stats['errors'].append(f"Row {row_num}: Error - {str(e)}")
+                            logger.error(f"Error processing row {row_num}: {e}")
+                        row_num += 1
             
             logger.info(f"Successfully processed {stats['valid_products']} products from Excel")
-            return products, stats
             
         except Exception as e:
             logger.error(f"Error reading Excel file: {e}")
             stats['errors'].append(f"Error reading Excel file: {str(e)}")
-            return [], stats
     
-    def _process_excel_row(self, row: pd.Series, row_num: int) -> Dict[str, Any]:
-        """Process a single Excel row"""
+    def _load_dataframe(self, excel_path: str, nrows: int = None, usecols=None, dtype=None) -> pd.DataFrame:
+        """Read the first sheet with the fastest engine available for the format"""
+        options = {'nrows': nrows, 'usecols': usecols, 'dtype': dtype}
+        ext = os.path.splitext(excel_path)[1].lower()
+        if ext == '.xls':
+            # Only xlrd still reads the legacy binary format
+            return pd.read_excel(excel_path, engine='xlrd', **options)
+        
+        try:
+            # Rust-backed reader, much faster than openpyxl's XML parsing
+            return pd.read_excel(excel_path, engine='calamine', **options)
+        except (ImportError, ValueError) as e:
+            # python-calamine not installed (or pandas too old to know it)
+            logger.debug(f"calamine engine unavailable: {e}")
+        
+        if ext == '.xlsb':
+            return pd.read_excel(excel_path, engine='pyxlsb', **options)
+        # pandas opens the workbook read-only, so rows are streamed
+        return pd.read_excel(excel_path, engine='openpyxl', **options)
+    
+    def _missing_columns(self, columns) -> List[str]:
+        """Required columns absent from the given headers, in required order"""
+        found = set(columns)
+        if found.issuperset(self.required_columns):
+            return []
+        return [col for col in self.required_columns if col not in found]
+    
+    @staticmethod
+    def _file_key(path: str):
+        """Identify one version of a file with a single stat, None if it is missing"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    
+    def _vectorized_clean(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Strip text fields and validate prices for the whole sheet at once"""
+        def text(column):
+            # Empty cells become empty strings rather than 'nan'
+            values = df[column]
+            return values.where(values.notna(), '').astype(str).str.strip()
+        
+        price_strs = text('price')
+        # ASCII prices are parsed for the whole column at once
+        numeric = pd.to_numeric(price_strs.str.replace(_PRICE_CLEAN_RE, '', regex=True), errors='coerce')
+        prices = numeric.where(numeric >= 0).map('{:.2f}'.format, na_action='ignore')
+        # to_numeric only reads ASCII digits, the rest (e.g. Arabic-Indic) goes through _validate_price
+        unparsed = numeric.isna() & (price_strs != '')
+        if unparsed.any():
+            prices[unparsed] = price_strs[unparsed].map(self._validate_price)
+        prices = prices.fillna("0")
+        
+        if 'sku' in df.columns:
+            skus = text('sku')
+        else:
+            skus = pd.Series([""] * len(df), dtype=object)
+        
+        return {
+            'title': text('title').to_numpy(dtype=object),
+            'description': text('description').to_numpy(dtype=object),
+            'price_str': price_strs.to_numpy(dtype=object),
+            'price': prices.to_numpy(dtype=object),
+            'sku': skus.to_numpy(dtype=object),
+            'images_path': text('images_path').to_numpy(dtype=object),
+        }
+    
+    def _process_excel_row(self, title: str, description: str, price_str: str, price: str,
+                           sku: str, images_path: str, images: List[str], row_num: int) -> Dict[str, Any]:
+        """Process a single Excel row whose fields were already cleaned"""
         try:
-            # Extract and validate required fields
-            title = str(row['title']).strip()
-            description = str(row['description']).strip()
-            price_str = str(row['price']).strip()
-            
             # Validate required fields
             if not title:
                 logger.warning(f"Row {row_num}: Missing title")
@@ -115,20 +249,9 @@ class ExcelProductProcessor:
                 logger.warning(f"Row {row_num}: Missing price")
                 return None
             
-            # Process price
-            price = self._validate_price(price_str)
             if price == "0":
                 logger.warning(f"Row {row_num}: Invalid price format: {price_str}")
             
-            # Process SKU (optional)
-            sku = ""
-            if 'sku' in row and pd.notna(row['sku']):
-                sku = str(row['sku']).strip()
-            
-            # Process images path
-            images_path = str(row['images_path']).strip()
-            images = self._get_images_from_path(images_path)
-            
             # Create product data dictionary
             product_data = {
                 'row_number': row_num,
@@ -159,76 +282,147 @@ class ExcelProductProcessor:
         
         images_path = str(images_path).strip()
         
+        # Rows frequently repeat the same path or pattern
+        cached = self._path_cache.get(images_path)
+        if cached is not None:
+            return list(cached)
+        
         try:
-            # Case 1: Multiple paths separated by semicolon or comma
-            if ';' in images_path or ',' in images_path:
-                separators = [';', ',']
-                for sep in separators:
-                    if sep in images_path:
-                        paths = [p.strip() for p in images_path.split(sep) if p.strip()]
-                        for path in paths:
-                            if os.path.exists(path):
-                                if os.path.isfile(path) and self._is_image_file(path):
-                                    images.append(path)
-                                elif os.path.isdir(path):
-                                    images.extend(self._get_images_from_directory(path))
-                        break
-            
-            # Case 2: Single file path
-            elif os.path.exists(images_path):
-                if os.path.isfile(images_path) and self._is_image_file(images_path):
-                    images.append(images_path)
+            # Semicolon lists win, so file names containing commas stay whole;
+            # commas only separate when there is no semicolon. A single path
+            # is just a one-element list
+            separator = ';' if ';' in images_path else ','
+            parts = [p.strip() for p in images_path.split(separator) if p.strip()]
+            for path in parts:
+                kind = self._classify_path(path)
                 
-                # Case 3: Directory path
-                elif os.path.isdir(images_path):
-                    images.extend(self._get_images_from_directory(images_path))
-            
-            # Case 4: Wildcard pattern (e.g., C:/images/product*.jpg)
-            else:
-                # Try as a wildcard pattern
-                matched_files = glob.glob(images_path, recursive=True)
-                for file_path in matched_files:
-                    if os.path.isfile(file_path) and self._is_image_file(file_path):
-                        images.append(file_path)
+                # Single file path
+                if kind == 'file':
+                    if self._is_image_file(path):
+                        images.append(path)
+                
+                # Directory path
+                elif kind == 'dir':
+                    images.extend(self._get_images_from_directory(path))
+                
+                # Wildcard pattern (e.g., C:/images/product*.jpg)
+                elif kind is None:
+                    images.extend(self._match_wildcard(path))
             
             # Sort images for consistency
             images.sort()
+            self._path_cache[images_path] = tuple(images)
             return images
             
         except Exception as e:
             logger.error(f"Error getting images from path '{images_path}': {e}")
             return []
     
+    def _match_wildcard(self, pattern: str) -> List[str]:
+        """Resolve a wildcard pattern to image files"""
+        parent, name_pattern = os.path.split(pattern)
+        if not glob.has_magic(name_pattern) or glob.has_magic(parent) or '**' in name_pattern:
+            # Wildcards in the directory part need a real glob
+            return [
+                file_path for file_path in glob.glob(pattern, recursive=True)
+                if self._is_image_file(file_path) and os.path.isfile(file_path)
+            ]
+        
+        # Only the file name is a pattern: match it against the cached
+        # listing of the parent folder
+        files = [name for name, kind in self._list_parent(parent).values() if kind == 'file']
+        
+        # Like glob, hidden files only match patterns that start with a dot
+        include_hidden = name_pattern.startswith('.')
+        return [
+            os.path.join(parent, name) for name in fnmatch.filter(files, name_pattern)
+            if (include_hidden or not name.startswith('.')) and self._is_image_file(name)
+        ]
+    
+    def _list_parent(self, parent: str) -> Dict[str, Tuple[str, str]]:
+        """Map each normcased name in a folder to (name, 'file'/'dir'/'other'), listed once per file load"""
+        listing = self._parent_listing_cache.get(parent)
+        if listing is None:
+            listing = {}
+            try:
+                # One scandir gives the type of every entry, instead of a
+                # stat call for each row that points into this folder
+                with os.scandir(parent or '.') as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir():
+                                kind = 'dir'
+                            elif entry.is_file():
+                                kind = 'file'
+                            else:
+                                kind = 'other'
+                        except OSError:
+                            kind = 'other'
+                        listing[os.path.normcase(entry.name)] = (entry.name, kind)
+            except (OSError, ValueError):
+                pass
+            self._parent_listing_cache[parent] = listing
+        return listing
+    
+    def _classify_path(self, path: str):
+        """Return 'file', 'dir', 'other' or None (missing) for a path"""
+        parent, name = os.path.split(path)
+        if name:
+            found = self._list_parent(parent).get(os.path.normcase(name))
+            if found is not None:
+                return found[1]
+            if glob.has_magic(path):
+                return None
+        
+        # Paths ending in a separator, or names the listing missed (e.g. a
+        # different case on a case-insensitive disk), fall back to one stat
+        try:
+            mode = os.stat(path).st_mode
+        except (OSError, ValueError):
+            return None
+        if stat.S_ISDIR(mode):
+            return 'dir'
+        if stat.S_ISREG(mode):
+            return 'file'
+        return 'other'
+    
     def _get_images_from_directory(self, directory_path: str) -> List[str]:
         """Get all images from a directory"""
+        directory_path = os.path.normpath(os.path.abspath(directory_path))
+        return list(self._cached_directory_images(directory_path))
+    
+    def _list_directory_images(self, directory_path: str) -> Tuple[str, ...]:
+        """Walk a directory for images, results are cached by read_excel_file"""
         images = []
         try:
-            directory = Path(directory_path)
-            if directory.exists() and directory.is_dir():
-                for ext in self.supported_image_extensions:
-                    pattern = f"*{ext}"
-                    for image_path in directory.rglob(pattern):
-                        images.append(str(image_path))
+            # One recursive scandir walk; DirEntry already knows each entry's type
+            pending = [directory_path]
+            while pending:
+                with os.scandir(pending.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            pending.append(entry.path)
+                        elif self._is_image_file(entry.name) and entry.is_file():
+                            images.append(entry.path)
             
             # Sort by filename
             images.sort()
-            return images
+            return tuple(images)
             
         except Exception as e:
             logger.error(f"Error getting images from directory {directory_path}: {e}")
-            return []
+            return ()
     
-    def _is_image_file(self, file_path: str) -> bool:
+    @staticmethod
+    def _is_image_file(file_path: str) -> bool:
         """Check if file is an image based on extension"""
-        ext = os.path.splitext(file_path)[1].lower()
-        return ext in self.supported_image_extensions
+        return is_image_name(file_path)
     
     def _validate_price(self, price_str: str) -> str:
         """Validate and format price"""
         try:
             # Remove any currency symbols, commas, and whitespace
-            import re
-            cleaned = re.sub(r'[^\d.]', '', price_str)
+            cleaned = price_str.translate(PRICE_DELETE_TABLE)
             if not cleaned:
                 return "0"
             
@@ -245,45 +439,29 @@ class ExcelProductProcessor:
     def export_to_excel_template(self, output_path: str = "product_template.xlsx"):
         """Create an Excel template with the required columns"""
         try:
-            # Create a sample DataFrame
-            sample_data = {
-                'title': ['Product 1', 'Product 2'],
-                'description': ['Description of product 1', 'Description of product 2'],
-                'price': [29.99, 49.99],
-                'sku': ['SKU001', 'SKU002'],
-                'images_path': [
-                    r'C:\Images\Product1\image1.jpg',  # Single image
-                    r'C:\Images\Product2'              # Directory with images
-                ]
-            }
-            
-            df = pd.DataFrame(sample_data)
-            
-            # Save to Excel
-            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Products', index=False)
-                
-                # Add instructions sheet
-                instructions = pd.DataFrame({
-                    'Column': ['title', 'description', 'price', 'sku', 'images_path'],
-                    'Required': ['Yes', 'Yes', 'Yes', 'No', 'Yes'],
-                    'Description': [
-                        'Product title',
-                        'Product description (HTML supported)',
-                        'Product price (numbers only, no currency symbols)',
-                        'Stock Keeping Unit (optional)',
-                        'Path to image file or directory containing images. Can be:\n- Single file: C:/images/product.jpg\n- Directory: C:/images/product/\n- Multiple files: C:/images/img1.jpg;C:/images/img2.jpg'
-                    ],
-                    'Example': [
-                        'Wireless Headphones',
-                        'Premium wireless headphones with noise cancellation',
-                        '99.99',
-                        'WH-2024-BLK',
-                        'C:\\Products\\Headphones\\images\\'
-                    ]
-                })
-                
-                instructions.to_excel(writer, sheet_name='Instructions', index=False)
+            # Sample rows
+            products = [
+                ('title', 'description', 'price', 'sku', 'images_path'),
+                ('Product 1', 'Description of product 1', 29.99, 'SKU001',
+                 r'C:\Images\Product1\image1.jpg'),  # Single image
+                ('Product 2', 'Description of product 2', 49.99, 'SKU002',
+                 r'C:\Images\Product2'),              # Directory with images
+            ]
+            
+            # Instructions sheet
+            instructions = [
+                ('Column', 'Required', 'Description', 'Example'),
+                ('title', 'Yes', 'Product title', 'Wireless Headphones'),
+                ('description', 'Yes', 'Product description (HTML supported)',
+                 'Premium wireless headphones with noise cancellation'),
+                ('price', 'Yes', 'Product price (numbers only, no currency symbols)', '99.99'),
+                ('sku', 'No', 'Stock Keeping Unit (optional)', 'WH-2024-BLK'),
+                ('images_path', 'Yes',
+                 'Path to image file or directory containing images. Can be:\n- Single file: C:/images/product.jpg\n- Directory: C:/images/product/\n- Multiple files: C:/images/img1.jpg;C:/images/img2.jpg',
+                 'C:\\Products\\Headphones\\images\\'),
+            ]
+            
+            self._write_sheets(output_path, [('Products', products), ('Instructions', instructions)])
             
             logger.info(f"Template created: {output_path}")
             return True
@@ -292,6 +470,30 @@ class ExcelProductProcessor:
             logger.error(f"Error creating template: {e}")
             return False
     
+    @staticmethod
+    def _write_sheets(output_path, sheets):
+        """Stream (sheet name, rows) pairs to an xlsx file without building a DataFrame"""
+        # xlsxwriter writes much faster, openpyxl is always installed
+        if importlib.util.find_spec('xlsxwriter'):
+            import xlsxwriter
+            workbook = xlsxwriter.Workbook(output_path, {'constant_memory': True})
+            try:
+                for name, rows in sheets:
+                    worksheet = workbook.add_worksheet(name)
+                    for row_num, row in enumerate(rows):
+                        worksheet.write_row(row_num, 0, row)
+            finally:
+                workbook.close()
+            return
+        
+        from openpyxl import Workbook
+        workbook = Workbook(write_only=True)
+        for name, rows in sheets:
+            worksheet = workbook.create_sheet(name)
+            for row in rows:
+                worksheet.append(row)
+        workbook.save(output_path)
+    
     def validate_excel_file(self, excel_path: str) -> Dict[str, Any]:
         """Validate Excel file structure before processing"""
         validation_result = {
@@ -305,24 +507,27 @@ class ExcelProductProcessor:
         
         try:
             # Check if file exists
-            if not os.path.exists(excel_path):
+            key = self._file_key(excel_path)
+            if key is None:
                 validation_result['errors'].append(f"File does not exist: {excel_path}")
                 return validation_result
             
             validation_result['file_exists'] = True
             
-            # Try to read the file
-            try:
-                df = pd.read_excel(excel_path, nrows=5)  # Read first 5 rows for validation
-            except Exception as e:
-                validation_result['errors'].append(f"Cannot read Excel file: {str(e)}")
-                return validation_result
+            # Try to read the file, unless this version was already probed
+            df = self._probe_cache.get(key)
+            if df is None:
+                try:
+                    df = self._load_dataframe(excel_path, nrows=5)  # Read first 5 rows for validation
+                except Exception as e:
+                    validation_result['errors'].append(f"Cannot read Excel file: {str(e)}")
+                    return validation_result
+                
+                df.columns = df.columns.str.strip().str.lower()
+                self._probe_cache[key] = df
             
             # Check columns
-            df.columns = df.columns.str.strip().str.lower()
-            required_columns = ['title', 'description', 'price', 'images_path']
-            
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = self._missing_columns(df.columns)
             
             if missing_columns:
                 validation_result['errors'].append(f"Missing columns: {', '.join(missing_columns)}")
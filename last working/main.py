@@ -1,15 +1,20 @@
 import os
 import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
+from tkinter import ttk, filedialog, messagebox, simpledialog
 import requests
-from requests.auth import HTTPBasicAuth
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
+import re
 import json
 from datetime import datetime
 import mimetypes
 import base64
 from PIL import Image
 import io
+import threading
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 # Optional AI imports
 try:
@@ -18,6 +23,32 @@ try:
 except ImportError:
     AI_AVAILABLE = False
 
+# Fixed system prompt keeps every request's prefix byte-identical, so the
+# provider's automatic prompt caching can reuse it; variable text goes last.
+# Titles and description come back from a single request
+PRODUCT_SYSTEM_PROMPT = (
+    "You are a product copywriter for e-commerce. Generate compelling product titles "
+    "and SEO-friendly product descriptions. Reply with a JSON object of the form "
+    '{"titles": ["...", "...", "..."], "description": "..."} containing 3 titles and '
+    "a detailed description that includes features, benefits, and specifications."
+)
+
+# Room for 3 titles plus a detailed description as JSON; a reply cut off at
+# the limit is retried with double the room, up to AI_MAX_ATTEMPTS requests
+AI_MAX_TOKENS = 1200
+AI_MAX_ATTEMPTS = 2
+
+
+class AIResponseTruncated(Exception):
+    """The completion stopped at max_tokens, so its text is incomplete"""
+
+
+# (connect, read) seconds, a stalled server must not hang the window
+REQUEST_TIMEOUT = (3.05, 30)
+
+# List numbering such as "1. " or "2) " that models sometimes keep in titles
+NUM_PREFIX_RE = re.compile(r'^\s*\d+[.)]\s+')
+
 # Load environment variables
 load_dotenv()
 
@@ -36,10 +67,28 @@ class WooCommerceProductUploader:
         
         # WooCommerce API endpoints
         self.wc_api_base = f"{self.store_url}/wp-json/wc/v3"
+        self.wp_api_base = f"{self.store_url}/wp-json/wp/v2"
+        
+        # Endpoint URLs are built once rather than per request
+        self.wc_products_url = f"{self.wc_api_base}/products"
+        self.wc_categories_url = f"{self.wc_api_base}/products/categories"
+        self.wp_media_url = f"{self.wp_api_base}/media"
+        self.wp_current_user_url = f"{self.wp_api_base}/users/me"
+        
+        # Pooled sessions so requests reuse connections instead of a new
+        # TCP+TLS handshake per call
+        self.wp_http = self.create_session(self.wp_username, self.wp_password)
+        self.wc_http = self.create_session(self.wc_consumer_key, self.wc_consumer_secret)
+        # Network and AI calls run here so the Tk main loop never blocks
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
         # Variables
         self.categories = []
         self.images = []
+        self.ai_client = None  # Created on first AI request
+        self.ai_cache = {}  # Completions by request hash
+        self.last_ai_result = None
         
         # Setup UI
         self.setup_ui()
@@ -47,6 +96,43 @@ class WooCommerceProductUploader:
         # Load categories
         self.load_categories()
     
+    def create_session(self, username, password):
+        """Create a session with basic auth, connection pooling and retries"""
+        session = requests.Session()
+        # Encode the basic auth header once instead of on every request
+        token = base64.b64encode(f"{username}:{password}".encode('utf-8')).decode('ascii')
+        session.headers['Authorization'] = f"Basic {token}"
+        retries = Retry(
+            total=3,
+            backoff_factor=0.3,
+            # POST is left to urllib3's default idempotent-only methods so
+            # product creates are never re-sent behind our back
+            status_forcelist=[429, 500, 502, 503, 504]
+        )
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retries)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+    
+    def on_close(self):
+        """Close the HTTP sessions and the window"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.wp_http.close()
+        self.wc_http.close()
+        self.root.destroy()
+    
+    def run_in_background(self, work, on_done, on_error):
+        """Run work on the executor, then call on_done(result) or on_error(exc) on the Tk thread"""
+        def finished(future):
+            try:
+                result = future.result()
+            except Exception as e:
+                self.root.after(0, on_error, e)
+            else:
+                self.root.after(0, on_done, result)
+        
+        self.executor.submit(work).add_done_callback(finished)
+    
     def setup_ui(self):
         # Main frame
         main_frame = ttk.Frame(self.root, padding="20")
@@ -146,6 +232,11 @@ class WooCommerceProductUploader:
     
     def log_message(self, message):
         """Add message to log"""
+        # Tk widgets may only be touched from the main thread
+        if threading.current_thread() is not threading.main_thread():
+            self.root.after(0, self.log_message, message)
+            return
+        
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.log_text.config(state=tk.NORMAL)
         self.log_text.insert(tk.END, f"[{timestamp}] {message}\n")
@@ -159,17 +250,13 @@ class WooCommerceProductUploader:
             self.log_message("Loading categories...")
             
             # WooCommerce API v3 uses different authentication
-            endpoint = f"{self.wc_api_base}/products/categories"
+            endpoint = self.wc_categories_url
             params = {
                 'per_page': 100,
                 'hide_empty': False
             }
             
-            response = requests.get(
-                endpoint,
-                auth=HTTPBasicAuth(self.wc_consumer_key, self.wc_consumer_secret),
-                params=params
-            )
+            response = self.wc_http.get(endpoint, params=params, timeout=REQUEST_TIMEOUT)
             
             if response.status_code == 200:
                 categories = response.json()
@@ -179,16 +266,20 @@ class WooCommerceProductUploader:
                 category_list = []
                 self.category_dict = {}
                 
-                def build_category_tree(cats, parent_id=0, level=0):
-                    for cat in cats:
-                        if cat['parent'] == parent_id:
-                            indent = "  " * level
-                            display_name = f"{indent}{cat['name']} (ID: {cat['id']})"
-                            category_list.append(display_name)
-                            self.category_dict[display_name] = cat['id']
-                            build_category_tree(cats, cat['id'], level + 1)
+                # Index children by parent once instead of rescanning every level
+                children = {}
+                for cat in categories:
+                    children.setdefault(cat['parent'], []).append(cat)
+                
+                def build_category_tree(parent_id=0, level=0):
+                    for cat in children.get(parent_id, ()):
+                        indent = "  " * level
+                        display_name = f"{indent}{cat['name']} (ID: {cat['id']})"
+                        category_list.append(display_name)
+                        self.category_dict[display_name] = cat['id']
+                        build_category_tree(cat['id'], level + 1)
                 
-                build_category_tree(categories)
+                build_category_tree()
                 
                 self.category_combo['values'] = category_list
                 self.log_message(f"Loaded {len(category_list)} categories")
@@ -234,13 +325,10 @@ class WooCommerceProductUploader:
                 # Swap in images list
                 self.images[index], self.images[new_index] = self.images[new_index], self.images[index]
                 
-                # Update listbox
-                items = list(self.image_listbox.get(0, tk.END))
-                items[index], items[new_index] = items[new_index], items[index]
-                
-                self.image_listbox.delete(0, tk.END)
-                for item in items:
-                    self.image_listbox.insert(tk.END, item)
+                # Move just the selected row, the rest of the listbox is untouched
+                item = self.image_listbox.get(index)
+                self.image_listbox.delete(index)
+                self.image_listbox.insert(new_index, item)
                 
                 self.image_listbox.selection_set(new_index)
                 self.log_message("Image order updated")
@@ -248,16 +336,12 @@ class WooCommerceProductUploader:
     def upload_media_to_wordpress(self, image_path):
         """Upload image to WordPress media library"""
         try:
-            # Open and prepare image
-            with open(image_path, 'rb') as img_file:
-                img_data = img_file.read()
-            
             # Get filename and mime type
             filename = os.path.basename(image_path)
             mime_type, _ = mimetypes.guess_type(image_path)
             
             # WordPress media endpoint
-            media_url = f"{self.store_url}/wp-json/wp/v2/media"
+            media_url = self.wp_media_url
             
             # Prepare headers
             headers = {
@@ -265,13 +349,15 @@ class WooCommerceProductUploader:
                 'Content-Type': mime_type
             }
             
-            # Upload using WordPress REST API with application password
-            response = requests.post(
-                media_url,
-                headers=headers,
-                data=img_data,
-                auth=HTTPBasicAuth(self.wp_username, self.wp_password)
-            )
+            # Upload using WordPress REST API with application password,
+            # streaming the file instead of reading it into memory
+            with open(image_path, 'rb') as img_file:
+                response = self.wp_http.post(
+                    media_url,
+                    headers=headers,
+                    data=img_file,
+                    timeout=REQUEST_TIMEOUT
+                )
             
             if response.status_code in [200, 201]:
                 media_data = response.json()
@@ -310,27 +396,31 @@ class WooCommerceProductUploader:
             messagebox.showerror("Error", "Invalid category selected")
             return
         
-        try:
-            self.log_message("Starting product upload...")
-            
-            # Upload images first
+        # Read the form here, widgets must not be touched from the worker
+        title = self.title_var.get().strip()
+        description = self.desc_text.get("1.0", tk.END).strip()
+        images = list(self.images)
+        
+        def work():
+            # Upload images first, in parallel over the pooled session;
+            # map keeps the original order so the first image stays featured
             uploaded_images = []
-            for i, image_path in enumerate(self.images):
-                self.log_message(f"Uploading image {i+1}/{len(self.images)}...")
-                media_info = self.upload_media_to_wordpress(image_path)
+            self.log_message(f"Uploading {len(images)} image(s)...")
+            with ThreadPoolExecutor(max_workers=min(8, len(images))) as executor:
+                results = list(executor.map(self.upload_media_to_wordpress, images))
+            for image_path, media_info in zip(images, results):
                 if media_info:
                     uploaded_images.append(media_info)
                 else:
                     self.log_message(f"Failed to upload image: {image_path}")
             
             if not uploaded_images:
-                messagebox.showerror("Error", "Failed to upload any images")
-                return
+                return None
             
             # Prepare product data
             product_data = {
-                'name': self.title_var.get().strip(),
-                'description': self.desc_text.get("1.0", tk.END).strip(),
+                'name': title,
+                'description': description,
                 'type': 'simple',
                 'regular_price': '0',  # You might want to add price field
                 'categories': [{'id': category_id}],
@@ -348,16 +438,19 @@ class WooCommerceProductUploader:
                     product_data['images'].append(image_data)
             
             # Create product using WooCommerce REST API
-            endpoint = f"{self.wc_api_base}/products"
+            endpoint = self.wc_products_url
             
-            response = requests.post(
+            return self.wc_http.post(
                 endpoint,
-                auth=HTTPBasicAuth(self.wc_consumer_key, self.wc_consumer_secret),
                 json=product_data,
-                headers={'Content-Type': 'application/json'}
+                headers={'Content-Type': 'application/json'},
+                timeout=REQUEST_TIMEOUT
             )
-            
-            if response.status_code == 201:
+        
+        def done(response):
+            if response is None:
+                messagebox.showerror("Error", "Failed to upload any images")
+            elif response.status_code == 201:
                 product = response.json()
                 self.log_message(f"Product created successfully! ID: {product['id']}")
                 messagebox.showinfo("Success", f"Product '{product['name']}' created successfully!\nID: {product['id']}")
@@ -368,10 +461,13 @@ class WooCommerceProductUploader:
                 self.log_message(f"Failed to create product: {response.status_code}")
                 self.log_message(f"Response: {response.text}")
                 messagebox.showerror("Error", f"Failed to create product: {response.status_code}\n{response.text}")
-                
-        except Exception as e:
+        
+        def failed(e):
             self.log_message(f"Error: {str(e)}")
             messagebox.showerror("Error", f"Failed to upload product: {str(e)}")
+        
+        self.log_message("Starting product upload...")
+        self.run_in_background(work, done, failed)
     
     def clear_form(self):
         """Clear all form fields"""
@@ -384,22 +480,29 @@ class WooCommerceProductUploader:
     
     def test_connection(self):
         """Test connection to WooCommerce API"""
-        try:
-            self.log_message("Testing connection...")
-            
-            # Test WordPress connection
-            wp_test = requests.get(
-                f"{self.store_url}/wp-json/wp/v2",
-                auth=HTTPBasicAuth(self.wp_username, self.wp_password)
-            )
-            
-            # Test WooCommerce connection
-            wc_test = requests.get(
-                f"{self.wc_api_base}/products",
-                auth=HTTPBasicAuth(self.wc_consumer_key, self.wc_consumer_secret),
-                params={'per_page': 1}
-            )
-            
+        def work():
+            # The WordPress and WooCommerce probes are independent, run both at once
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                # Test WordPress connection
+                # users/me is small and, unlike the route index, needs valid credentials
+                wp_future = executor.submit(
+                    self.wp_http.get,
+                    self.wp_current_user_url,
+                    params={'_fields': 'id'},
+                    timeout=(3.05, 10)
+                )
+                
+                # Test WooCommerce connection
+                wc_future = executor.submit(
+                    self.wc_http.get,
+                    self.wc_products_url,
+                    params={'per_page': 1, '_fields': 'id'},
+                    timeout=(3.05, 10)
+                )
+                return wp_future.result(), wc_future.result()
+        
+        def done(responses):
+            wp_test, wc_test = responses
             if wp_test.status_code == 200 and wc_test.status_code == 200:
                 self.log_message("✓ Connection successful!")
                 messagebox.showinfo("Connection Test", "Successfully connected to both WordPress and WooCommerce APIs!")
@@ -407,10 +510,68 @@ class WooCommerceProductUploader:
                 self.log_message(f"✗ Connection failed: WP={wp_test.status_code}, WC={wc_test.status_code}")
                 messagebox.showerror("Connection Test", 
                                    f"Connection failed:\nWordPress: {wp_test.status_code}\nWooCommerce: {wc_test.status_code}")
-                
-        except Exception as e:
+        
+        def failed(e):
             self.log_message(f"✗ Connection error: {str(e)}")
             messagebox.showerror("Connection Test", f"Connection error: {str(e)}")
+        
+        self.log_message("Testing connection...")
+        self.run_in_background(work, done, failed)
+    
+    def chat_completion(self, messages, max_tokens, model="gpt-3.5-turbo", **params):
+        """Return the completion text, reusing earlier answers to the same request"""
+        key = hashlib.sha256(
+            json.dumps([model, messages, max_tokens, params], sort_keys=True).encode('utf-8')
+        ).hexdigest()
+        if key in self.ai_cache:
+            self.log_message("AI cache hit")
+            return self.ai_cache[key]
+        
+        if self.ai_client is None:
+            # One client for the whole session, its connection pool stays warm
+            self.ai_client = openai.OpenAI(api_key=os.environ['OPENAI_API_KEY'])
+        
+        response = self.ai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            **params
+        )
+        choice = response.choices[0]
+        if choice.finish_reason == "length":
+            # Cut-off JSON cannot be parsed, and must not be cached either
+            raise AIResponseTruncated(f"AI reply exceeded {max_tokens} tokens")
+        content = choice.message.content
+        self.ai_cache[key] = content
+        return content
+    
+    def ai_generate_all(self, prompt):
+        """Generate titles and a description for a product in one JSON request"""
+        max_tokens = AI_MAX_TOKENS
+        for attempt in range(AI_MAX_ATTEMPTS):
+            try:
+                content = self.chat_completion(
+                    messages=[
+                        {"role": "system", "content": PRODUCT_SYSTEM_PROMPT},
+                        {"role": "user", "content": f"Product: {prompt}"}
+                    ],
+                    max_tokens=max_tokens,
+                    response_format={"type": "json_object"}
+                )
+                break
+            except AIResponseTruncated:
+                if attempt == AI_MAX_ATTEMPTS - 1:
+                    raise
+                max_tokens *= 2
+        result = json.loads(content)
+        
+        # Kept so asking for the description afterwards needs no request
+        self.last_ai_result = {
+            'prompt': prompt,
+            'titles': [t for t in (NUM_PREFIX_RE.sub('', str(t)).strip() for t in result.get('titles', [])) if t],
+            'description': str(result.get('description', '')).strip()
+        }
+        return self.last_ai_result
     
     def generate_ai_title(self):
         """Generate product title using AI"""
@@ -427,43 +588,37 @@ class WooCommerceProductUploader:
             if not prompt:
                 return
         
-        try:
-            # You'll need to set your OpenAI API key
-            api_key = os.getenv('OPENAI_API_KEY')
+        # You'll need to set your OpenAI API key
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            api_key = simpledialog.askstring("OpenAI API Key", 
+                                           "Enter your OpenAI API key:", show='*')
             if not api_key:
-                api_key = simpledialog.askstring("OpenAI API Key", 
-                                               "Enter your OpenAI API key:", show='*')
-                if not api_key:
-                    return
-                os.environ['OPENAI_API_KEY'] = api_key
-            
-            openai.api_key = api_key
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a product title generator for e-commerce. Generate compelling product titles."},
-                    {"role": "user", "content": f"Generate 3 product titles for: {prompt}"}
-                ],
-                max_tokens=100
-            )
-            
-            titles = response.choices[0].message.content.strip().split('\n')
-            titles = [t.replace('1.', '').replace('2.', '').replace('3.', '').strip() for t in titles if t.strip()]
+                return
+            os.environ['OPENAI_API_KEY'] = api_key
+        
+        def done(titles):
+            if not titles:
+                messagebox.showinfo("AI Title Generation", "No titles were generated. Try again.")
+                return
             
-            # Show titles in a dialog
+            # Show titles in a dialog, one combobox instead of a button per title
             title_dialog = tk.Toplevel(self.root)
             title_dialog.title("Select AI-Generated Title")
             
             tk.Label(title_dialog, text="Choose a title:").pack(pady=10)
             
-            for i, title in enumerate(titles[:3]):  # Show first 3
-                btn = ttk.Button(title_dialog, text=title, 
-                               command=lambda t=title: self.select_ai_title(t, title_dialog))
-                btn.pack(pady=2, padx=20)
-            
-        except Exception as e:
+            choice = tk.StringVar(value=titles[0])
+            ttk.Combobox(title_dialog, textvariable=choice, values=titles[:3],  # Show first 3
+                         state="readonly", width=60).pack(pady=2, padx=20)
+            ttk.Button(title_dialog, text="OK",
+                       command=lambda: self.select_ai_title(choice.get(), title_dialog)).pack(pady=10)
+        
+        def failed(e):
             messagebox.showerror("AI Error", f"Failed to generate title: {str(e)}")
+        
+        self.log_message("Generating AI titles...")
+        self.run_in_background(lambda: self.ai_generate_all(prompt)['titles'], done, failed)
     
     def select_ai_title(self, title, dialog):
         """Select an AI-generated title"""
@@ -483,71 +638,85 @@ class WooCommerceProductUploader:
             messagebox.showwarning("Input Required", "Please enter a product title first")
             return
         
-        try:
-            api_key = os.getenv('OPENAI_API_KEY')
+        api_key = os.getenv('OPENAI_API_KEY')
+        if not api_key:
+            api_key = simpledialog.askstring("OpenAI API Key", 
+                                           "Enter your OpenAI API key:", show='*')
             if not api_key:
-                api_key = simpledialog.askstring("OpenAI API Key", 
-                                               "Enter your OpenAI API key:", show='*')
-                if not api_key:
-                    return
-                os.environ['OPENAI_API_KEY'] = api_key
-            
-            openai.api_key = api_key
-            
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a product description writer for e-commerce. Write SEO-friendly product descriptions."},
-                    {"role": "user", "content": f"Write a detailed product description for: {product_title}\nInclude features, benefits, and specifications."}
-                ],
-                max_tokens=300
-            )
-            
-            description = response.choices[0].message.content.strip()
-            
+                return
+            os.environ['OPENAI_API_KEY'] = api_key
+        
+        def done(description):
             # Clear and insert new description
             self.desc_text.delete("1.0", tk.END)
             self.desc_text.insert("1.0", description)
             self.log_message("AI description generated")
-            
-        except Exception as e:
+        
+        def failed(e):
             messagebox.showerror("AI Error", f"Failed to generate description: {str(e)}")
+        
+        # The title request already wrote a description for this product
+        last = self.last_ai_result
+        if last and (product_title == last['prompt'] or product_title in last['titles']):
+            done(last['description'])
+        else:
+            self.log_message("Generating AI description...")
+            self.run_in_background(lambda: self.ai_generate_all(product_title)['description'], done, failed)
+
+# Written once every required package was found, keyed by the package list
+DEPS_MARKER = os.path.join(os.path.expanduser('~'), '.wc_uploader', '.deps_ok')
 
 # Install required packages function
 def check_dependencies():
     """Check and install required packages"""
     import subprocess
     import sys
+    import importlib.util
     
-    required = [
-        'requests',
-        'python-dotenv',
-        'Pillow'  # For image handling if needed
-    ]
+    # pip package name -> import name
+    required = {
+        'requests': 'requests',
+        'python-dotenv': 'dotenv',
+        'Pillow': 'PIL'  # For image handling if needed
+    }
     
-    missing = []
-    for package in required:
-        try:
-            __import__(package.replace('-', '_'))
-        except ImportError:
-            missing.append(package)
+    # Skip the probe on later launches with the same interpreter and list
+    key = hashlib.md5(repr((sys.executable, sorted(required))).encode()).hexdigest()
+    try:
+        with open(DEPS_MARKER) as f:
+            if f.read() == key:
+                return
+    except OSError:
+        pass
+    
+    # find_spec only locates the packages, nothing gets imported
+    missing = [package for package, module in required.items()
+               if importlib.util.find_spec(module) is None]
     
     if missing:
         print(f"Missing packages: {', '.join(missing)}")
         response = input("Install missing packages? (y/n): ")
         if response.lower() == 'y':
-            for package in missing:
-                print(f"Installing {package}...")
-                subprocess.check_call([sys.executable, "-m", "pip", "install", package])
+            # One pip run resolves everything at once instead of one per package
+            print(f"Installing {', '.join(missing)}...")
+            subprocess.check_call([sys.executable, "-m", "pip", "install", *missing])
             print("Installation complete!")
+            missing = []
     
     # Check for optional AI package
-    try:
-        import openai
+    if importlib.util.find_spec('openai') is not None:
         print("OpenAI package found - AI features enabled")
-    except ImportError:
+    else:
         print("OpenAI not installed - AI features disabled")
         print("To enable AI: pip install openai")
+    
+    if not missing:
+        try:
+            os.makedirs(os.path.dirname(DEPS_MARKER), exist_ok=True)
+            with open(DEPS_MARKER, 'w') as f:
+                f.write(key)
+        except OSError:
+            pass
 
 def main():
     """Main function"""
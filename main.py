@@ -2,21 +2,72 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import os
 import threading
-import queue
+import time
+import operator
+import logging
+from functools import partial, lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from dotenv import load_dotenv
-import pandas as pd
 from excel_processor import ExcelProductProcessor
 # Import our modules
 from api_client import WooCommerceAPI, WordPressMediaAPI
 from upload_queue import UploadQueueManager
 from ai_helper import AIHelper
 from bulk_processor import BulkProductProcessor
-from utils import setup_logging, validate_image_paths, format_price, build_category_tree
+from utils import setup_logging, format_price, build_category_tree, count_images, load_env
 
-load_dotenv()
+load_env()
 setup_logging()
 
+logger = logging.getLogger(__name__)
+
+# Rows inserted into a treeview per event loop callback
+TREE_INSERT_BATCH = 200
+# Larger Excel loads only keep the rows in view inside the treeview
+VIRTUAL_TREE_THRESHOLD = 1000
+TREE_WHEEL_ROWS = 3
+# Bulk tree columns drawn until "Show details" is ticked
+BULK_TREE_COMPACT_COLUMNS = ('row', 'title', 'status')
+# Queue stats and status messages pushed in quick succession are shown together
+STATS_DEBOUNCE_MS = 100
+# Shared pool for background work started from the UI
+BACKGROUND_WORKERS = 4
+
+# (second, "HH:MM:SS") of the last clock_time() call
+_clock_cache = (None, "")
+
+
+def clock_time():
+    """Current local time as HH:MM:SS, formatted at most once per second"""
+    global _clock_cache
+    now = int(time.time())
+    second, text = _clock_cache
+    if second != now:
+        text = time.strftime("%H:%M:%S", time.localtime(now))
+        _clock_cache = (now, text)
+    return text
+
+
+@lru_cache(maxsize=4096)
+def truncate_path(path):
+    """Shorten a long path for display, repeated paths are served from the cache"""
+    return path if len(path) <= 40 else path[:20] + "..." + path[-20:]
+
+
+def prepare_queue_item(product, category_id, batch_id, timestamp):
+    """Build the upload queue payload for one bulk product"""
+    return {
+        'title': product.get('title', ''),
+        'description': product.get('description', ''),
+        'price': product.get('price', '0'),
+        'category_id': category_id,
+        'images': product.get('images', []),
+        'sku': product.get('sku', ''),
+        'batch_id': batch_id,
+        'excel_row': product.get('excel_row', ''),
+        'timestamp': timestamp
+    }
+
 class ProductUploaderApp:
     def __init__(self, root):
         self.root = root
@@ -39,16 +90,36 @@ class ProductUploaderApp:
             max_workers=3
         )
         self.queue_manager.on_upload_complete = self._on_upload_complete
+        self.queue_manager.on_upload_batch_complete = self._on_upload_batch_complete
+        self.queue_manager.on_stats_changed = self._on_queue_stats_changed
+        self._pending_stats = None
+        self._stats_flush_scheduled = False
+        # Counters are bumped from worker threads and shown by _flush_stats
+        self._stats_lock = threading.Lock()
+        self.stats_counts = dict.fromkeys(
+            ('queue_size', 'active_workers', 'completed', 'failed', 'total_bulk'), 0)
+        self._stats_shown = {}
+        # Latest status bar text, shown by _flush_status
+        self._status_text = None
+        self._status_lock = threading.Lock()
+        # Loads, scans, exports, API and AI calls share these threads
+        self.task_executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='uploader-io')
         
         # Variables
         self.categories = []
         self.category_tree = []
         self.images = []
         self.category_dict = {}
+        # AI prompts already answered this session, asking again means regenerate
+        self._ai_prompts_done = set()
         self.upload_history = []
         
         # Bulk upload variables
         self.bulk_products = []
+        self._bulk_tree_load_id = 0
+        # (values, tag) rows backing a virtualized bulk tree, None when all rows are inserted
+        self._virtual_rows = None
+        self._virtual_first = 0
         self.bulk_category_id = None
         self.bulk_directory = ""
         self.current_batch_id = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -59,8 +130,17 @@ class ProductUploaderApp:
         # Load categories
         self.load_categories()
         
-        # Setup periodic queue update
-        self.update_queue_status()
+        # Queue status is pushed by the queue manager on every change
+        self._on_queue_stats_changed(self.queue_manager.get_stats_snapshot())
+    
+    def run_in_background(self, work):
+        """Run work on the shared background pool, logging anything it raises"""
+        def log_failure(future):
+            if not future.cancelled() and future.exception() is not None:
+                error = future.exception()
+                self.root.after(0, lambda: self.log_message(f"Background task failed: {error}", "error"))
+        
+        self.task_executor.submit(work).add_done_callback(log_failure)
     
     @property
     def wc_api(self):
@@ -213,7 +293,7 @@ class ProductUploaderApp:
         ttk.Button(button_frame, text="🗑️ Clear Form", 
                   command=self.clear_form).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="🔄 Refresh Categories", 
-                  command=self.load_categories).pack(side=tk.LEFT, padx=5)
+                  command=lambda: self.load_categories(refresh=True)).pack(side=tk.LEFT, padx=5)
         ttk.Button(button_frame, text="🔗 Test Connection", 
                   command=self.test_connection).pack(side=tk.LEFT, padx=5)
         
@@ -309,6 +389,7 @@ class ProductUploaderApp:
         self.bulk_tree = ttk.Treeview(
             preview_frame,
             columns=columns,
+            displaycolumns=BULK_TREE_COMPACT_COLUMNS,
             show='headings',
             height=10
         )
@@ -331,12 +412,25 @@ class ProductUploaderApp:
         self.bulk_tree.column('images_path', width=200)
         self.bulk_tree.column('status', width=100)
         
-        # Add scrollbar
-        tree_scroll = ttk.Scrollbar(preview_frame, orient=tk.VERTICAL, command=self.bulk_tree.yview)
-        self.bulk_tree.configure(yscrollcommand=tree_scroll.set)
+        # Tags for coloring, configured once for every load
+        self.bulk_tree.tag_configure('has_images', foreground='green')
+        self.bulk_tree.tag_configure('no_images', foreground='orange')
+        
+        # Add scrollbar, it also drives the virtualized view of large loads
+        self.bulk_tree_scroll = ttk.Scrollbar(preview_frame, orient=tk.VERTICAL, command=self._on_bulk_scroll)
+        self.bulk_tree.configure(yscrollcommand=self.bulk_tree_scroll.set)
+        self.bulk_tree.bind('<Configure>', lambda event: self._refresh_visible())
+        self.bulk_tree.bind('<MouseWheel>', self._on_bulk_tree_wheel)
+        self.bulk_tree.bind('<Button-4>', self._on_bulk_tree_wheel)
+        self.bulk_tree.bind('<Button-5>', self._on_bulk_tree_wheel)
         
         self.bulk_tree.grid(row=0, column=0, sticky="nsew")
-        tree_scroll.grid(row=0, column=1, sticky="ns")
+        self.bulk_tree_scroll.grid(row=0, column=1, sticky="ns")
+        
+        # Hidden columns keep their values, they are just not drawn
+        self.bulk_details_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(preview_frame, text="Show details", variable=self.bulk_details_var,
+                        command=self.toggle_bulk_details).grid(row=1, column=0, sticky="w", pady=(5, 0))
         
         # Statistics Frame
         row += 1
@@ -396,8 +490,7 @@ class ProductUploaderApp:
         
         # Clear existing products
         self.bulk_products = []
-        for item in self.bulk_tree.get_children():
-            self.bulk_tree.delete(item)
+        self._clear_bulk_tree()
         
         # Show progress
         self.log_message(f"Loading Excel file: {excel_path}")
@@ -423,18 +516,20 @@ class ProductUploaderApp:
                     return
                 
                 # Update UI with products
-                self.root.after(0, lambda: self._update_bulk_tree_excel(products))
+                # Row values are built here so the Tk thread only inserts
+                rows = self._excel_tree_rows(products)
+                self.root.after(0, lambda: self._update_bulk_tree_excel(rows))
                 
-                # Update statistics
-                total_images = sum(p.get('image_count', 0) for p in products)
+                # Update statistics, counted by the processor while reading
+                total_images = stats['total_images']
                 stats_text = f"""
     📊 EXCEL LOAD COMPLETE
     ──────────────────────────────────
     File: {os.path.basename(excel_path)}
     Total Products: {len(products)}
     Total Images: {total_images}
-    Products with Images: {sum(1 for p in products if p.get('has_images'))}
-    Products without Images: {sum(1 for p in products if not p.get('has_images'))}
+    Products with Images: {stats['products_with_images']}
+    Products without Images: {stats['products_without_images']}
     ──────────────────────────────────
     """
                 self.root.after(0, lambda: self.bulk_stats_var.set(stats_text))
@@ -469,39 +564,135 @@ class ProductUploaderApp:
                 ))
         
         # Run load in separate thread
-        threading.Thread(target=load_thread, daemon=True).start()
+        self.run_in_background(load_thread)
 
-    def _update_bulk_tree_excel(self, products):
-        """Update the bulk treeview with products from Excel"""
+    @staticmethod
+    def _excel_tree_rows(products):
+        """Build (values, tag) pairs for the bulk treeview from Excel products"""
+        fields = operator.itemgetter(
+            'excel_row', 'title', 'sku', 'price', 'image_count', 'images_path', 'has_images'
+        )
+        rows = []
+        for excel_row, title, sku, price, image_count, images_path, has_images in map(fields, products):
+            values = (
+                excel_row, title[:40], sku, f"${price}", image_count, truncate_path(images_path),
+                "✅ Ready" if has_images else "⚠️ No Images"
+            )
+            rows.append((values, 'has_images' if has_images else 'no_images'))
+        return rows
+    
+    def _update_bulk_tree_excel(self, rows):
+        """Update the bulk treeview with rows from _excel_tree_rows"""
         # Clear existing items
-        for item in self.bulk_tree.get_children():
-            self.bulk_tree.delete(item)
+        self._clear_bulk_tree()
         
-        # Add products to treeview
-        for product in products:
-            status = "✅ Ready" if product.get('has_images') else "⚠️ No Images"
-            images_path = product.get('images_path', '')
-            # Truncate long paths for display
-            if len(images_path) > 40:
-                images_path = images_path[:20] + "..." + images_path[-20:]
-            
-            self.bulk_tree.insert(
-                '', 'end',
-                values=(
-                    product.get('excel_row', ''),
-                    product.get('title', '')[:40],
-                    product.get('sku', ''),
-                    f"${product.get('price', '0')}",
-                    product.get('image_count', 0),
-                    images_path,
-                    status
-                ),
-                tags=('has_images' if product.get('has_images') else 'no_images',)
-            )
+        if len(rows) > VIRTUAL_TREE_THRESHOLD:
+            # Only the rows in view become tree items, scrolling swaps them
+            self._virtual_rows = rows
+            self.bulk_tree.configure(yscrollcommand='')
+            self._refresh_visible()
+            return
         
-        # Configure tags for coloring
-        self.bulk_tree.tag_configure('has_images', foreground='green')
-        self.bulk_tree.tag_configure('no_images', foreground='orange')
+        # Insert in chunks so the window keeps repainting on large files;
+        # a newer load cancels whatever is still pending from this one
+        self._insert_bulk_tree_rows(rows, 0, self._bulk_tree_load_id)
+    
+    def toggle_bulk_details(self):
+        """Show all bulk tree columns or only the compact set"""
+        if self.bulk_details_var.get():
+            self.bulk_tree.configure(displaycolumns='#all')
+        else:
+            self.bulk_tree.configure(displaycolumns=BULK_TREE_COMPACT_COLUMNS)
+    
+    def _clear_bulk_tree(self):
+        """Remove all bulk tree rows and leave virtual mode"""
+        # Also cancels chunked inserts still pending from an earlier load
+        self._bulk_tree_load_id += 1
+        if self._virtual_rows is not None:
+            self._virtual_rows = None
+            self._virtual_first = 0
+            self.bulk_tree.configure(yscrollcommand=self.bulk_tree_scroll.set)
+        self.bulk_tree.delete(*self.bulk_tree.get_children())
+    
+    def _visible_row_count(self):
+        """Number of rows that fit in the bulk tree as currently sized"""
+        height = self.bulk_tree.winfo_height()
+        if height <= 1:
+            return int(self.bulk_tree.cget('height'))
+        try:
+            row_height = int(ttk.Style().lookup('Treeview', 'rowheight'))
+        except (ValueError, tk.TclError):
+            row_height = 20
+        # One row's worth of height goes to the headings
+        return max(1, height // row_height - 1)
+    
+    def _refresh_visible(self):
+        """Show the virtual rows in view, reusing tree items that stay visible"""
+        rows = self._virtual_rows
+        if rows is None:
+            return
+        
+        total = len(rows)
+        count = self._visible_row_count()
+        first = max(0, min(self._virtual_first, total - count))
+        self._virtual_first = first
+        wanted = range(first, min(total, first + count))
+        
+        # Item ids are Excel row numbers, so rows still in view are left alone
+        wanted_ids = [str(rows[i][0][0]) for i in wanted]
+        existing = self.bulk_tree.get_children()
+        keep = set(wanted_ids)
+        stale = [iid for iid in existing if iid not in keep]
+        if stale:
+            self.bulk_tree.delete(*stale)
+        present = set(existing).difference(stale)
+        
+        insert = self.bulk_tree.insert
+        for position, (index, iid) in enumerate(zip(wanted, wanted_ids)):
+            if iid not in present:
+                values, tag = rows[index]
+                insert('', position, iid=iid, values=values, tags=(tag,))
+        
+        self.bulk_tree_scroll.set(first / total, (first + len(wanted)) / total)
+    
+    def _on_bulk_scroll(self, *args):
+        """Scrollbar command, moves the virtual window instead of the tree when virtualized"""
+        if self._virtual_rows is None:
+            return self.bulk_tree.yview(*args)
+        
+        if args[0] == 'moveto':
+            self._virtual_first = int(float(args[1]) * len(self._virtual_rows))
+        elif args[0] == 'scroll':
+            step = self._visible_row_count() if args[2] == 'pages' else 1
+            self._virtual_first += int(args[1]) * step
+        self._refresh_visible()
+    
+    def _on_bulk_tree_wheel(self, event):
+        """Scroll the virtual window with the mouse wheel"""
+        if self._virtual_rows is None:
+            return None
+        
+        if event.num == 4 or event.delta > 0:
+            direction = -1
+        else:
+            direction = 1
+        self._virtual_first += direction * TREE_WHEEL_ROWS
+        self._refresh_visible()
+        return "break"
+    
+    def _insert_bulk_tree_rows(self, rows, start, load_id):
+        """Insert one chunk of treeview rows, then yield to the event loop"""
+        if load_id != self._bulk_tree_load_id:
+            return
+        
+        insert = self.bulk_tree.insert
+        for values, tag in rows[start:start + TREE_INSERT_BATCH]:
+            # The Excel row number is the item id, see _update_product_statuses_excel
+            insert('', 'end', iid=str(values[0]), values=values, tags=(tag,))
+        
+        start += TREE_INSERT_BATCH
+        if start < len(rows):
+            self.root.after_idle(self._insert_bulk_tree_rows, rows, start, load_id)
 
     def create_excel_template(self):
         """Create an Excel template file"""
@@ -512,11 +703,14 @@ class ProductUploaderApp:
             initialfile="product_template.xlsx"
         )
         
-        if file_path:
+        if not file_path:
+            return
+        
+        def template_thread():
             try:
                 success = self.excel_processor.export_to_excel_template(file_path)
                 if success:
-                    messagebox.showinfo(
+                    self.root.after(0, lambda: messagebox.showinfo(
                         "Template Created",
                         f"Excel template created successfully!\n\n"
                         f"Location: {file_path}\n\n"
@@ -524,12 +718,14 @@ class ProductUploaderApp:
                         f"• Sample data\n"
                         f"• Instructions sheet\n"
                         f"• Required columns: title, description, price, sku, images_path"
-                    )
-                    self.log_message(f"Created Excel template: {file_path}")
+                    ))
+                    self.root.after(0, lambda: self.log_message(f"Created Excel template: {file_path}"))
                 else:
-                    messagebox.showerror("Error", "Failed to create template")
+                    self.root.after(0, lambda: messagebox.showerror("Error", "Failed to create template"))
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to create template: {str(e)}")
+                self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to create template: {str(e)}"))
+        
+        self.run_in_background(template_thread)
 
     def setup_queue_frame(self):
         """Setup the queue management tab"""
@@ -547,28 +743,18 @@ class ProductUploaderApp:
         stats_frame = ttk.LabelFrame(self.queue_frame, text="Statistics", padding=10)
         stats_frame.grid(row=1, column=0, columnspan=3, sticky="ew", padx=10, pady=5)
         
-        self.stats_vars = {
-            'queue_size': tk.StringVar(value="0"),
-            'active_workers': tk.StringVar(value="0"),
-            'completed': tk.StringVar(value="0"),
-            'failed': tk.StringVar(value="0"),
-            'total_bulk': tk.StringVar(value="0")
-        }
-        
-        ttk.Label(stats_frame, text="Items in queue:").grid(row=0, column=0, sticky="w", padx=5)
-        ttk.Label(stats_frame, textvariable=self.stats_vars['queue_size']).grid(row=0, column=1, sticky="w", padx=5)
-        
-        ttk.Label(stats_frame, text="Active uploads:").grid(row=0, column=2, sticky="w", padx=5)
-        ttk.Label(stats_frame, textvariable=self.stats_vars['active_workers']).grid(row=0, column=3, sticky="w", padx=5)
-        
-        ttk.Label(stats_frame, text="Completed:").grid(row=1, column=0, sticky="w", padx=5)
-        ttk.Label(stats_frame, textvariable=self.stats_vars['completed']).grid(row=1, column=1, sticky="w", padx=5)
-        
-        ttk.Label(stats_frame, text="Failed:").grid(row=1, column=2, sticky="w", padx=5)
-        ttk.Label(stats_frame, textvariable=self.stats_vars['failed']).grid(row=1, column=3, sticky="w", padx=5)
-        
-        ttk.Label(stats_frame, text="Bulk in queue:").grid(row=2, column=0, sticky="w", padx=5)
-        ttk.Label(stats_frame, textvariable=self.stats_vars['total_bulk']).grid(row=2, column=1, sticky="w", padx=5)
+        # Plain labels, their text is set by _flush_stats only when a value changes
+        self.stats_labels = {}
+        for key, caption, row, column in (
+            ('queue_size', "Items in queue:", 0, 0),
+            ('active_workers', "Active uploads:", 0, 2),
+            ('completed', "Completed:", 1, 0),
+            ('failed', "Failed:", 1, 2),
+            ('total_bulk', "Bulk in queue:", 2, 0),
+        ):
+            ttk.Label(stats_frame, text=caption).grid(row=row, column=column, sticky="w", padx=5)
+            self.stats_labels[key] = ttk.Label(stats_frame, text="0")
+            self.stats_labels[key].grid(row=row, column=column + 1, sticky="w", padx=5)
         
         # Queue control buttons
         control_frame = ttk.Frame(self.queue_frame)
@@ -651,8 +837,7 @@ class ProductUploaderApp:
         
         # Clear existing products
         self.bulk_products = []
-        for item in self.bulk_tree.get_children():
-            self.bulk_tree.delete(item)
+        self._clear_bulk_tree()
         
         # Show progress
         self.log_message(f"Scanning directory: {directory}")
@@ -682,7 +867,7 @@ class ProductUploaderApp:
                 self.root.after(0, lambda: self._update_bulk_tree(valid_products))
                 
                 # Update statistics
-                total_images = sum(p.get('image_count', 0) for p in valid_products)
+                total_images = stats['total_images']
                 stats_text = f"""
 📊 SCAN COMPLETE
 ────────────────────────
@@ -727,34 +912,39 @@ Products without Images: {stats['without_images']}
                 ))
         
         # Run scan in separate thread
-        threading.Thread(target=scan_thread, daemon=True).start()
+        self.run_in_background(scan_thread)
     
     def _update_bulk_tree(self, products):
         """Update the bulk treeview with scanned products"""
         # Clear existing items
-        for item in self.bulk_tree.get_children():
-            self.bulk_tree.delete(item)
+        self._clear_bulk_tree()
         
-        # Add products to treeview
+        # Row values are built before the tree is touched
+        rows = []
+        seen = set()
         for product in products:
-            status = "✅ Ready" if product.get('has_images') else "⚠️ No Images"
-            
-            self.bulk_tree.insert(
-                '', 'end',
-                values=(
-                    product.get('folder_name', ''),
-                    product.get('title', '')[:50],
-                    product.get('sku', ''),
-                    f"${product.get('price', '0')}",
-                    product.get('image_count', 0),
-                    status
-                ),
-                tags=('has_images' if product.get('has_images') else 'no_images',)
+            has_images = product.get('has_images')
+            folder_name = product.get('folder_name', '')
+            values = (
+                folder_name,
+                product.get('title', '')[:50],
+                product.get('sku', ''),
+                f"${product.get('price', '0')}",
+                product.get('image_count', 0),
+                truncate_path(product.get('folder_path', '')),
+                "✅ Ready" if has_images else "⚠️ No Images"
             )
-        
-        # Configure tags for coloring
-        self.bulk_tree.tag_configure('has_images', foreground='green')
-        self.bulk_tree.tag_configure('no_images', foreground='orange')
+            # The folder name is the item id so status updates can address it
+            iid = folder_name if folder_name and folder_name not in seen else None
+            seen.add(folder_name)
+            rows.append((iid, values, ('has_images' if has_images else 'no_images',)))
+        
+        # Hidden while filling, so the tree is laid out once instead of per row
+        self.bulk_tree.grid_remove()
+        insert = self.bulk_tree.insert
+        for iid, values, tags in rows:
+            insert('', 'end', iid=iid, values=values, tags=tags)
+        self.bulk_tree.grid()
         
     def queue_bulk_products(self):
         """Add all loaded products to the upload queue"""
@@ -775,14 +965,14 @@ Products without Images: {stats['without_images']}
         
         # Confirm bulk upload
         product_count = len(self.bulk_products)
-        total_images = sum(p.get('image_count', 0) for p in self.bulk_products)
+        total_images, with_images = count_images(self.bulk_products)
         
         confirm = messagebox.askyesno(
             "Confirm Bulk Upload",
             f"Add {product_count} products to upload queue?\n\n"
             f"• Total images: {total_images}\n"
             f"• Category: {category_display.split('(')[0].strip()}\n"
-            f"• Products without images: {sum(1 for p in self.bulk_products if not p.get('has_images'))}\n\n"
+            f"• Products without images: {product_count - with_images}\n\n"
             f"Upload will run in background. Continue?"
         )
         
@@ -792,47 +982,60 @@ Products without Images: {stats['without_images']}
         # Create batch ID
         batch_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         
-        # Add each product to queue
-        added_count = 0
-        skipped_count = 0
-        
-        for product in self.bulk_products:
-            # Check if product has images
-            if not product.get('has_images'):
-                # Ask user preference
-                upload_without_images = messagebox.askyesno(
-                    "Missing Images",
-                    f"Product '{product.get('title')}' has no images.\n\n"
-                    f"Upload without images?"
-                )
-                
-                if not upload_without_images:
-                    skipped_count += 1
-                    continue
-            
-            # Prepare product data for queue
-            queue_data = {
-                'title': product.get('title', ''),
-                'description': product.get('description', ''),
-                'price': product.get('price', '0'),
-                'category_id': category_id,
-                'images': product.get('images', []),
-                'sku': product.get('sku', ''),
-                'batch_id': batch_id,
-                'excel_row': product.get('excel_row', ''),
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            # Add to queue
-            self.queue_manager.add_to_queue(queue_data)
-            added_count += 1
-            
-            # Update product status in treeview
-            self._update_product_status_excel(product.get('excel_row'), "⏳ Queued")
+        # One question for all products without images instead of one per product
+        missing_count = product_count - with_images
+        include_missing = True
+        if missing_count:
+            include_missing = messagebox.askyesnocancel(
+                "Missing Images",
+                f"{missing_count} product(s) have no images.\n\n"
+                f"Yes: upload them without images\n"
+                f"No: skip them\n"
+                f"Cancel: do not queue anything"
+            )
+            if include_missing is None:
+                return
+        
+        if include_missing:
+            selected = list(self.bulk_products)
+        else:
+            selected = [p for p in self.bulk_products if p.get('has_images')]
+        skipped_count = product_count - len(selected)
+        
+        # Products of one batch share its timestamp
+        prepare = partial(prepare_queue_item, category_id=category_id, batch_id=batch_id,
+                          timestamp=datetime.now().isoformat())
+        category_name = category_display.split('(')[0].strip()
+        
+        def prepare_thread():
+            try:
+                # Missing images are reported by the upload itself, no file checks here
+                queued_products = [prepare(product) for product in selected]
+                if queued_products:
+                    # Products are queued together for batch creation
+                    self.queue_manager.add_batch_to_queue(queued_products)
+                self.root.after(0, lambda: self._finish_bulk_queue(
+                    queued_products, skipped_count, category_name, batch_id))
+            except Exception as e:
+                self.root.after(0, lambda: self.log_message(f"Queue preparation error: {e}", "error"))
+                self.root.after(0, lambda: self.upload_bulk_btn.config(state=tk.NORMAL))
+        
+        # A second click while preparing would queue the same products twice
+        self.upload_bulk_btn.config(state=tk.DISABLED)
+        self.log_message(f"Preparing {len(selected)} products for upload...")
+        self.run_in_background(prepare_thread)
+    
+    def _finish_bulk_queue(self, queued_products, skipped_count, category_name, batch_id):
+        """Report queued bulk products (runs on the Tk thread)"""
+        self.upload_bulk_btn.config(state=tk.NORMAL)
+        added_count = len(queued_products)
+        
+        if queued_products:
+            self._update_product_statuses_excel(
+                {str(p['excel_row']) for p in queued_products}, "⏳ Queued")
         
         # Update statistics
-        bulk_in_queue = int(self.stats_vars['total_bulk'].get()) + added_count
-        self.stats_vars['total_bulk'].set(str(bulk_in_queue))
+        self._bump_stat('total_bulk', added_count)
         
         # Log results
         self.log_message(
@@ -843,7 +1046,7 @@ Products without Images: {stats['without_images']}
         messagebox.showinfo(
             "Bulk Upload Started",
             f"✅ Added {added_count} products to upload queue.\n\n"
-            f"• Uploading to category: {category_display.split('(')[0].strip()}\n"
+            f"• Uploading to category: {category_name}\n"
             f"• Batch ID: {batch_id}\n"
             f"• Skipped products: {skipped_count}\n\n"
             f"Upload will run in background. Check the Queue tab for progress."
@@ -852,26 +1055,43 @@ Products without Images: {stats['without_images']}
         # Clear bulk list after adding to queue
         self.clear_bulk_list()
 
+    def _update_product_statuses_excel(self, row_numbers, status):
+        """Update status of several products in the bulk treeview"""
+        if self._virtual_rows is not None:
+            # Rows out of view pick up the status when scrolled in
+            rows = self._virtual_rows
+            for index, (values, tag) in enumerate(rows):
+                if str(values[0]) in row_numbers:
+                    rows[index] = (values[:6] + (status,), tag)
+            for iid in self.bulk_tree.get_children():
+                if iid in row_numbers:
+                    self.bulk_tree.set(iid, 'status', status)
+            return
+        
+        # Applied in chunks between redraws so large batches don't freeze the window
+        self._apply_status_batch([str(row) for row in row_numbers], 0, status)
+    
+    def _apply_status_batch(self, iids, start, status):
+        """Set the status of one chunk of bulk tree items, then yield to the event loop"""
+        for iid in iids[start:start + TREE_INSERT_BATCH]:
+            self._set_bulk_status(iid, status)
+        
+        start += TREE_INSERT_BATCH
+        if start < len(iids):
+            self.root.after_idle(self._apply_status_batch, iids, start, status)
+
     def _update_product_status_excel(self, row_number, status):
         """Update status of a product in the bulk treeview (Excel version)"""
-        for item in self.bulk_tree.get_children():
-            values = self.bulk_tree.item(item, 'values')
-            if values and values[0] == str(row_number):
-                # Update status column (index 6)
-                new_values = list(values)
-                new_values[6] = status
-                self.bulk_tree.item(item, values=new_values)
-                break    
+        self._set_bulk_status(str(row_number), status)
+    
     def _update_product_status(self, folder_name, status):
         """Update status of a product in the bulk treeview"""
-        for item in self.bulk_tree.get_children():
-            values = self.bulk_tree.item(item, 'values')
-            if values and values[0] == folder_name:
-                # Update status column (index 5)
-                new_values = list(values)
-                new_values[5] = status
-                self.bulk_tree.item(item, values=new_values)
-                break
+        self._set_bulk_status(folder_name, status)
+    
+    def _set_bulk_status(self, iid, status):
+        """Set the status column of one bulk tree item, if it is in the tree"""
+        if self.bulk_tree.exists(iid):
+            self.bulk_tree.set(iid, 'status', status)
     
     def export_bulk_products(self):
         """Export scanned products to CSV"""
@@ -885,19 +1105,28 @@ Products without Images: {stats['without_images']}
             filetypes=[("CSV files", "*.csv"), ("All files", "*.*")]
         )
         
-        if file_path:
-            try:
-                self.bulk_processor.export_products_to_csv(self.bulk_products, file_path)
-                messagebox.showinfo("Export Successful", f"Products exported to:\n{file_path}")
-                self.log_message(f"Exported {len(self.bulk_products)} products to CSV")
-            except Exception as e:
-                messagebox.showerror("Export Error", f"Failed to export: {str(e)}")
+        if not file_path:
+            return
+        
+        # Rows are streamed to disk from a worker thread; the list itself is
+        # never copied, a later load just rebinds self.bulk_products
+        products = self.bulk_products
+        
+        def export_thread():
+            if self.bulk_processor.export_products_to_csv(products, file_path):
+                self.root.after(0, lambda: messagebox.showinfo(
+                    "Export Successful", f"Products exported to:\n{file_path}"))
+                self.root.after(0, lambda: self.log_message(f"Exported {len(products)} products to CSV"))
+            else:
+                self.root.after(0, lambda: messagebox.showerror(
+                    "Export Error", "Failed to export products, see the log for details"))
+        
+        self.run_in_background(export_thread)
     
     def clear_bulk_list(self):
         """Clear the bulk products list"""
         self.bulk_products = []
-        for item in self.bulk_tree.get_children():
-            self.bulk_tree.delete(item)
+        self._clear_bulk_tree()
         
         self.bulk_stats_var.set("No products scanned")
         self.log_message("Bulk list cleared")
@@ -911,142 +1140,195 @@ Products without Images: {stats['without_images']}
         summary = self.bulk_processor.create_batch_summary(self.bulk_products)
         self.root.clipboard_clear()
         self.root.clipboard_append(summary)
-        self.root.update()  # Keep the clipboard content after the window is closed
+        self.root.update_idletasks()  # Sync the clipboard without draining queued input events
         
         messagebox.showinfo("Summary Copied", "Batch summary copied to clipboard!")
     
     def _on_upload_complete(self, result):
-        """Callback for when an upload completes"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        """Callback for when an upload completes (called on the results thread)"""
+        # One Tk callback per result, the time is taken when the upload finished
+        self.root.after_idle(self._apply_upload_result, result, clock_time())
+    
+    def _on_upload_batch_complete(self, results):
+        """Callback for several results at once (called on the results thread)"""
+        self.root.after_idle(self._apply_upload_results, results, clock_time())
+    
+    def _apply_upload_results(self, results, timestamp):
+        """Record a burst of upload results in one Tk callback"""
+        for result in results:
+            self._apply_upload_result(result, timestamp)
+    
+    def _apply_upload_result(self, result, timestamp):
+        """Record an upload result in the history, stats and status bar"""
+        task = result.get('task', {})
+        title = task.get('title', 'Unknown')
+        batch_id = task.get('batch_id', '')
+        
+        # Determine upload type
+        upload_type = "Bulk" if batch_id else "Single"
+        short_title = title[:40] + "..." if len(title) > 40 else title
         
         if result.get('success'):
             product_id = result.get('data', {}).get('id', 'N/A')
-            title = result.get('task', {}).get('title', 'Unknown')
-            batch_id = result.get('task', {}).get('batch_id', '')
-            
-            # Determine upload type
-            upload_type = "Bulk" if batch_id else "Single"
             
             # Add to history tree
-            self.root.after(0, lambda: self.history_tree.insert(
+            self.history_tree.insert(
                 '', 'end',
                 values=(
                     timestamp,
-                    title[:40] + "..." if len(title) > 40 else title,
+                    short_title,
                     "✅ Success",
                     product_id,
                     f"Batch: {batch_id}" if batch_id else "Single upload",
                     upload_type
                 )
-            ))
+            )
             
             # Update stats
-            completed = int(self.stats_vars['completed'].get()) + 1
-            self.stats_vars['completed'].set(str(completed))
+            self._bump_stat('completed')
             
             # Update bulk count if it's a bulk upload
             if batch_id:
-                current_bulk = int(self.stats_vars['total_bulk'].get())
-                if current_bulk > 0:
-                    self.stats_vars['total_bulk'].set(str(current_bulk - 1))
+                self._bump_stat('total_bulk', -1)
             
-            self.root.after(0, lambda: self.log_message(
-                f"Upload successful: {title} (ID: {product_id})"
-            ))
+            self.log_message(f"Upload successful: {title} (ID: {product_id})")
         else:
-            title = result.get('task', {}).get('title', 'Unknown')
             error = result.get('error', 'Unknown error')
-            batch_id = result.get('task', {}).get('batch_id', '')
-            upload_type = "Bulk" if batch_id else "Single"
             
             # Add to history tree
-            self.root.after(0, lambda: self.history_tree.insert(
+            self.history_tree.insert(
                 '', 'end',
                 values=(
                     timestamp,
-                    title[:40] + "..." if len(title) > 40 else title,
+                    short_title,
                     "❌ Failed",
                     "N/A",
                     error[:80],
                     upload_type
                 )
-            ))
+            )
             
             # Update stats
-            failed = int(self.stats_vars['failed'].get()) + 1
-            self.stats_vars['failed'].set(str(failed))
+            self._bump_stat('failed')
             
-            self.root.after(0, lambda: self.log_message(
-                f"Upload failed: {title} - {error}", "error"
-            ))
-        
-        # Update queue stats
-        self.update_stats()
+            self.log_message(f"Upload failed: {title} - {error}", "error")
     
-    def update_queue_status(self):
-        """Periodically update queue status"""
-        queue_size = self.queue_manager.get_queue_size()
-        active_workers = self.queue_manager.get_active_workers()
-        
-        self.queue_status_var.set(
-            f"Queue: {queue_size} items waiting | {active_workers} active uploads"
-        )
-        
-        # Update stats in queue tab
-        self.stats_vars['queue_size'].set(str(queue_size))
-        self.stats_vars['active_workers'].set(str(active_workers))
-        
-        # Schedule next update
-        self.root.after(1000, self.update_queue_status)
+    def _on_queue_stats_changed(self, snapshot):
+        """Keep the latest queue stats, bursts are flushed once per STATS_DEBOUNCE_MS"""
+        self._pending_stats = snapshot
+        self._schedule_stats_flush()
+    
+    def _bump_stat(self, key, delta=1):
+        """Change one of the queue tab counters (never below zero)"""
+        with self._stats_lock:
+            self.stats_counts[key] = max(0, self.stats_counts[key] + delta)
+        self._schedule_stats_flush()
+    
+    def _schedule_stats_flush(self):
+        """Schedule one _flush_stats call unless one is already pending"""
+        # Called from worker threads too, the check and set must not interleave
+        with self._stats_lock:
+            if self._stats_flush_scheduled:
+                return
+            self._stats_flush_scheduled = True
+        self.root.after(STATS_DEBOUNCE_MS, self._flush_stats)
+    
+    def _flush_stats(self):
+        """Update queue status and the queue tab counters in one pass"""
+        with self._stats_lock:
+            self._stats_flush_scheduled = False
+            snapshot, self._pending_stats = self._pending_stats, None
+        if snapshot is not None:
+            queue_size = snapshot['queue_size']
+            active_workers = snapshot['active_workers']
+            status_text = f"Queue: {queue_size} items waiting | {active_workers} active uploads"
+            # Reading the variable is cheaper than a set that fires the label trace
+            if self.queue_status_var.get() != status_text:
+                self.queue_status_var.set(status_text)
+            with self._stats_lock:
+                self.stats_counts['queue_size'] = queue_size
+                self.stats_counts['active_workers'] = active_workers
+        
+        with self._stats_lock:
+            counts = self.stats_counts.copy()
+        for key, value in counts.items():
+            if self._stats_shown.get(key) != value:
+                self._stats_shown[key] = value
+                self.stats_labels[key].configure(text=str(value))
     
     # ==========================
     # EXISTING SINGLE PRODUCT METHODS
     # ==========================
     
     def log_message(self, message, level="info"):
-        """Add message to status bar and log"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.status_var.set(f"{timestamp}: {message}")
+        """Add message to status bar and log (Tk thread only, workers go through root.after)"""
+        # Bursts of messages only repaint the status bar with the latest one;
+        # the check and set must not interleave with _flush_status
+        with self._status_lock:
+            pending = self._status_text is not None
+            self._status_text = f"{clock_time()}: {message}"
+        if not pending:
+            self.root.after(STATS_DEBOUNCE_MS, self._flush_status)
         
         if level == "error":
-            print(f"ERROR: {message}")
+            logger.error(message)
         else:
-            print(f"INFO: {message}")
+            logger.info(message)
     
-    def load_categories(self):
+    def _flush_status(self):
+        """Show the latest status message"""
+        with self._status_lock:
+            text, self._status_text = self._status_text, None
+        if text is not None:
+            self.status_var.set(text)
+    
+    def load_categories(self, refresh=False):
         """Load categories from WooCommerce"""
         def worker():
-            self.log_message("Loading categories...")
+            self.root.after(0, lambda: self.log_message("Loading categories..."))
             try:
-                categories = self.wc_api.get_categories()
-                if categories:
-                    self.categories = categories
-                    category_list, category_tree = build_category_tree(categories)
-                    
-                    # Update both comboboxes in main thread
-                    self.root.after(0, lambda: self._update_category_combos(category_list))
-                    self.log_message(f"Loaded {len(category_list)} categories")
+                shown = False
+                if refresh:
+                    # An explicit refresh drops the cache so a failed fetch cannot bring old data back
+                    self.wc_api.invalidate_categories_cache()
                 else:
+                    # Show the last known categories right away, even if stale,
+                    # and only go to the store when they are out of date
+                    cached, fresh = self.wc_api.get_cached_categories()
+                    if cached:
+                        self._apply_categories(cached)
+                        shown = True
+                        if fresh:
+                            return
+                
+                categories = self.wc_api.get_categories(use_cache=False)
+                if categories:
+                    self._apply_categories(categories)
+                elif not shown:
                     self.root.after(0, lambda: messagebox.showwarning(
                         "Warning", "No categories found or failed to load"
                     ))
             except Exception as e:
                 self.root.after(0, lambda: self.log_message(f"Error loading categories: {e}", "error"))
         
-        threading.Thread(target=worker, daemon=True).start()
+        self.run_in_background(worker)
+    
+    def _apply_categories(self, categories):
+        """Build the category tree off the Tk thread, then update the comboboxes"""
+        self.categories = categories
+        category_list, category_ids, _ = build_category_tree(categories)
+        
+        # Update both comboboxes in main thread
+        self.root.after(0, lambda: self._update_category_combos(category_list, category_ids))
+        self.root.after(0, lambda: self.log_message(f"Loaded {len(category_list)} categories"))
     
-    def _update_category_combos(self, category_list):
+    def _update_category_combos(self, category_list, category_ids):
         """Update both category comboboxes"""
         self.category_combo['values'] = category_list
         self.bulk_category_combo['values'] = category_list
         
-        # Build mapping for display names to IDs
-        self.category_dict = {}
-        for cat in self.categories:
-            for display_name in category_list:
-                if f"(ID: {cat['id']})" in display_name:
-                    self.category_dict[display_name] = cat['id']
-                    break
+        # Mapping for display names to IDs
+        self.category_dict = category_ids
     
     def add_images(self):
         """Add images to the list"""
@@ -1058,10 +1340,17 @@ Products without Images: {stats['without_images']}
             ]
         )
         
+        # Avoid duplicates, a set keeps this linear for large selections
+        seen = set(self.images)
+        new_files = []
         for file in files:
-            if file not in self.images:  # Avoid duplicates
-                self.images.append(file)
-                self.image_listbox.insert(tk.END, os.path.basename(file))
+            if file not in seen:
+                seen.add(file)
+                new_files.append(file)
+        
+        if new_files:
+            self.images.extend(new_files)
+            self.image_listbox.insert(tk.END, *map(os.path.basename, new_files))
         
         if files:
             self.log_message(f"Added {len(files)} image(s)")
@@ -1086,13 +1375,10 @@ Products without Images: {stats['without_images']}
                 # Swap in images list
                 self.images[index], self.images[new_index] = self.images[new_index], self.images[index]
                 
-                # Update listbox
-                items = list(self.image_listbox.get(0, tk.END))
-                items[index], items[new_index] = items[new_index], items[index]
-                
-                self.image_listbox.delete(0, tk.END)
-                for item in items:
-                    self.image_listbox.insert(tk.END, item)
+                # Move just the selected row, the rest of the listbox is untouched
+                item = self.image_listbox.get(index)
+                self.image_listbox.delete(index)
+                self.image_listbox.insert(new_index, item)
                 
                 self.image_listbox.selection_set(new_index)
                 self.log_message("Image order updated")
@@ -1168,7 +1454,7 @@ Products without Images: {stats['without_images']}
     def test_connection(self):
         """Test connection to WooCommerce API"""
         def worker():
-            self.log_message("Testing connection...")
+            self.root.after(0, lambda: self.log_message("Testing connection..."))
             try:
                 if self.wc_api.test_connection():
                     self.root.after(0, lambda: messagebox.showinfo(
@@ -1187,7 +1473,7 @@ Products without Images: {stats['without_images']}
                     f"Error: {str(e)}"
                 ))
         
-        threading.Thread(target=worker, daemon=True).start()
+        self.run_in_background(worker)
     
     def generate_ai_title(self):
         """Generate product title using AI"""
@@ -1230,9 +1516,12 @@ Products without Images: {stats['without_images']}
                 if not prompt:
                     return
         
+        regenerate = ('title', prompt) in self._ai_prompts_done
+        self._ai_prompts_done.add(('title', prompt))
+        
         def worker():
             try:
-                titles = self.ai_helper.generate_title(prompt, num_titles=3)
+                titles = self.ai_helper.generate_title(prompt, num_titles=3, regenerate=regenerate)
                 if titles:
                     self.root.after(0, lambda: self._show_ai_titles(titles))
                 else:
@@ -1246,7 +1535,7 @@ Products without Images: {stats['without_images']}
                     f"Failed to generate title: {str(e)}"
                 ))
         
-        threading.Thread(target=worker, daemon=True).start()
+        self.run_in_background(worker)
     
     def _show_ai_titles(self, titles):
         """Show AI-generated titles in a dialog"""
@@ -1290,9 +1579,24 @@ Products without Images: {stats['without_images']}
             messagebox.showwarning("Input Required", "Please enter a product title first")
             return
         
+        started = False
+        
+        def show_chunk(text):
+            # Replace the old description only once the first text arrives
+            nonlocal started
+            if not started:
+                started = True
+                self.root.after(0, self.desc_text.delete, "1.0", tk.END)
+            self.root.after(0, self.desc_text.insert, tk.END, text)
+        
+        regenerate = ('description', product_title) in self._ai_prompts_done
+        self._ai_prompts_done.add(('description', product_title))
+        
         def worker():
             try:
-                description = self.ai_helper.generate_description(product_title)
+                # Show the text as it streams in instead of after the whole answer
+                description = self.ai_helper.generate_description(
+                    product_title, on_chunk=show_chunk, regenerate=regenerate)
                 if description:
                     self.root.after(0, lambda: self._apply_ai_description(description))
                 else:
@@ -1306,7 +1610,7 @@ Products without Images: {stats['without_images']}
                     f"Failed to generate description: {str(e)}"
                 ))
         
-        threading.Thread(target=worker, daemon=True).start()
+        self.run_in_background(worker)
     
     def _apply_ai_description(self, description):
         """Apply AI-generated description"""
@@ -1333,6 +1637,7 @@ Products without Images: {stats['without_images']}
     def on_closing(self):
         """Clean up when closing the application"""
         self.queue_manager.stop()
+        self.task_executor.shutdown(wait=False, cancel_futures=True)
         self.root.destroy()
     
     def update_stats(self):
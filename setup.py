@@ -2,35 +2,41 @@
 import os
 import sys
 import subprocess
+import importlib.util
 
 def check_and_install_dependencies():
     """Check and install required packages"""
-    required = [
-        'requests>=2.28.0',
-        'python-dotenv>=0.21.0',
-        'Pillow>=9.0.0',
-    ]
+    # pip requirement -> import name
+    required = {
+        'requests>=2.28.0': 'requests',
+        'python-dotenv>=0.21.0': 'dotenv',
+        'Pillow>=9.0.0': 'PIL',
+    }
     
-    optional = [
-        'openai>=0.27.0'
-    ]
+    optional = {
+        'openai>=1.0.0': 'openai'
+    }
     
     print("Checking dependencies...")
     
-    for package in required:
-        try:
-            __import__(package.split('>=')[0].replace('-', '_'))
+    missing = []
+    for package, module in required.items():
+        if importlib.util.find_spec(module) is not None:
             print(f"✓ {package}")
-        except ImportError:
-            print(f"✗ {package} - Installing...")
-            subprocess.check_call([sys.executable, "-m", "pip", "install", package])
+        else:
+            print(f"✗ {package}")
+            missing.append(package)
+    
+    # One pip run resolves everything at once instead of one per package
+    if missing:
+        print(f"Installing {', '.join(missing)}...")
+        subprocess.check_call([sys.executable, "-m", "pip", "install", *missing])
     
     print("\nOptional dependencies for AI features:")
-    for package in optional:
-        try:
-            __import__(package.split('>=')[0].replace('-', '_'))
+    for package, module in optional.items():
+        if importlib.util.find_spec(module) is not None:
             print(f"✓ {package} (AI features enabled)")
-        except ImportError:
+        else:
             print(f"✗ {package} (AI features disabled)")
     
     # Create .env.example if it doesn't exist
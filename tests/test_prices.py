@@ -0,0 +1,46 @@
+import os
+import sys
+import unittest
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_processor import ExcelProductProcessor
+from bulk_processor import BulkProductProcessor
+
+
+class ExcelPriceTests(unittest.TestCase):
+    def test_non_ascii_digits_match_scalar_cleaner(self):
+        processor = ExcelProductProcessor()
+        raw = ['٣٤.٥', '$1,299.99', '12', 'abc', None]
+        df = pd.DataFrame({
+            'title': ['t'] * len(raw),
+            'description': [''] * len(raw),
+            'price': raw,
+            'images_path': [''] * len(raw),
+        })
+        cleaned = processor._vectorized_clean(df)['price']
+        expected = [processor._validate_price(value or '') for value in raw]
+        self.assertEqual(list(cleaned), expected)
+        self.assertEqual(cleaned[0], '34.50')
+
+
+class BulkPriceTests(unittest.TestCase):
+    def test_vectorized_prices_match_validate_price(self):
+        processor = BulkProductProcessor()
+        raw = ['٣٤.٥', '$1,299.99', '12', 'abc', '']
+        products = [{'price': value} for value in raw]
+        processor._validate_prices_vectorized(products)
+        self.assertEqual([p['price'] for p in products],
+                         [processor._validate_price(value) for value in raw])
+        self.assertEqual(products[0]['price'], '34.50')
+
+    
+    def test_superscript_digits_are_cleaned_not_zeroed(self):
+        processor = BulkProductProcessor()
+        self.assertEqual(processor._validate_price('5²'), '5.00')
+
+
+if __name__ == '__main__':
+    unittest.main()
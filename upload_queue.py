@@ -1,37 +1,56 @@
+import os
+import re
 import queue
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 import logging
+from api_client import PRODUCT_BATCH_SIZE
 
 logger = logging.getLogger(__name__)
 
+# Above this many products bulk groups grow with the import size
+LARGE_BATCH_THRESHOLD = 500
+LARGE_BATCH_MIN = 50
+
+# Workers above min_workers exit after this long without a task
+WORKER_IDLE_TIMEOUT = 60
+
+# WooCommerce error for an image id that no longer exists in the media library
+INVALID_IMAGE_ERROR = 'woocommerce_product_invalid_image_id'
+_IMAGE_ID_RE = re.compile(r'#(\d+)')
+
 class UploadQueueManager:
-    def __init__(self, wc_api, wp_api, max_workers=3):
+    def __init__(self, wc_api, wp_api, max_workers=3, image_workers=8, min_workers=1,
+                 idle_timeout=WORKER_IDLE_TIMEOUT):
         self.wc_api = wc_api
         self.wp_api = wp_api
         self.upload_queue = queue.Queue()
         self.results_queue = queue.Queue()
         self.running = True
         self.max_workers = max_workers
+        self.min_workers = max(1, min(min_workers, max_workers))
+        self.idle_timeout = idle_timeout
+        # Workers are started on demand by _ensure_workers and retire when idle
         self.workers = []
+        self._workers_lock = threading.Lock()
+        self._idle_workers = 0
+        self._worker_seq = 0
+        # Shared by all workers, the media API bounds open uploads itself
+        self.image_executor = ThreadPoolExecutor(max_workers=image_workers)
         
-        # Stats
+        # Stats, updated by every worker so changes go through _count
+        self._stats_lock = threading.Lock()
         self.stats = {
             'completed': 0,
             'failed': 0,
             'total': 0
         }
         
-        # Start worker threads
-        for i in range(max_workers):
-            worker = threading.Thread(
-                target=self._process_queue_worker,
-                args=(f"Worker-{i+1}",),
-                daemon=True
-            )
-            worker.start()
-            self.workers.append(worker)
+        # Start the resident worker threads
+        with self._workers_lock:
+            for _ in range(self.min_workers):
+                self._start_worker()
         
         # Start results processor
         self.results_thread = threading.Thread(
@@ -40,26 +59,74 @@ class UploadQueueManager:
         )
         self.results_thread.start()
     
+    def _start_worker(self):
+        """Start one more upload worker, caller holds _workers_lock"""
+        self._worker_seq += 1
+        worker = threading.Thread(
+            target=self._process_queue_worker,
+            args=(f"Worker-{self._worker_seq}",),
+            daemon=True
+        )
+        self.workers.append(worker)
+        self._idle_workers += 1
+        worker.start()
+    
+    def _ensure_workers(self):
+        """Start workers until queued tasks have an idle worker each or max_workers is reached"""
+        with self._workers_lock:
+            while (self.running and len(self.workers) < self.max_workers
+                   and self.upload_queue.qsize() > self._idle_workers):
+                self._start_worker()
+    
+    def _retire_worker(self):
+        """Remove the calling idle worker unless it is needed, returns True if it should exit"""
+        with self._workers_lock:
+            if len(self.workers) <= self.min_workers or self.upload_queue.qsize():
+                return False
+            self.workers.remove(threading.current_thread())
+            self._idle_workers -= 1
+            return True
+    
     def _process_queue_worker(self, worker_name):
         """Worker thread function to process upload tasks"""
-        while self.running:
+        busy = False
+        while True:
+            if busy:
+                with self._workers_lock:
+                    self._idle_workers += 1
+                busy = False
+            
+            # Blocks without polling, stop() wakes every worker with a None sentinel
             try:
-                # Get task from queue (wait up to 1 second)
-                task = self.upload_queue.get(timeout=1)
-                logger.info(f"{worker_name} processing: {task.get('title', 'Unknown')}")
+                task = self.upload_queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                if self._retire_worker():
+                    logger.info(f"{worker_name} idle, exiting")
+                    self._notify_stats()
+                    return
+                continue
+            with self._workers_lock:
+                self._idle_workers -= 1
+            busy = True
+            
+            if task is None or not self.running:
+                self.upload_queue.task_done()
+                return
+            
+            try:
+                self._notify_stats()
                 
-                # Upload images first
-                uploaded_images = []
-                for i, image_path in enumerate(task['images']):
-                    result = self.wp_api.upload_media(image_path)
-                    if result['success']:
-                        uploaded_images.append(result)
-                        logger.info(f"{worker_name}: Uploaded image {i+1}/{len(task['images'])}")
-                    else:
-                        logger.error(f"{worker_name}: Failed to upload {image_path}")
-                        # Continue with other images even if one fails
+                # Excel bulk uploads arrive as groups created in one request
+                if 'products' in task:
+                    self._process_batch_task(worker_name, task['products'])
+                    self.upload_queue.task_done()
+                    self._notify_stats()
+                    continue
                 
-                if not uploaded_images:
+                logger.info(f"{worker_name} processing: {task.get('title', 'Unknown')}")
+                
+                wc_product_data = self._prepare_product(worker_name, task)
+                if wc_product_data is None:
                     self.results_queue.put({
                         'success': False,
                         'title': task['title'],
@@ -67,49 +134,34 @@ class UploadQueueManager:
                         'task': task
                     })
                     self.upload_queue.task_done()
+                    self._notify_stats()
                     continue
                 
-                # Prepare product data for WooCommerce
-                wc_product_data = {
-                    'name': task['title'],
-                    'description': task['description'],
-                    'type': 'simple',
-                    'regular_price': task['price'],
-                    'categories': [{'id': task['category_id']}],
-                    'sku': task.get('sku', ''),
-                    'images': []
-                }
-                
-                # Add images to product
-                for i, img_info in enumerate(uploaded_images):
-                    image_data = {'id': img_info['id']}
-                    if i == 0:  # First image is featured
-                        wc_product_data['images'].insert(0, image_data)
-                    else:
-                        wc_product_data['images'].append(image_data)
-                
                 # Create product in WooCommerce
                 result = self.wc_api.create_product(wc_product_data)
+                if not result['success']:
+                    fresh_data = self._reupload_rejected_media(worker_name, task, wc_product_data, result)
+                    if fresh_data is not None:
+                        result = self.wc_api.create_product(fresh_data)
                 result['task'] = task
                 
                 # Update stats
                 if result['success']:
-                    self.stats['completed'] += 1
+                    self._count('completed')
                 else:
-                    self.stats['failed'] += 1
+                    self._count('failed')
                 
                 # Put result in results queue
                 self.results_queue.put(result)
                 
                 # Mark task as done
                 self.upload_queue.task_done()
+                self._notify_stats()
                 logger.info(f"{worker_name} completed: {task.get('title', 'Unknown')}")
                 
-            except queue.Empty:
-                continue
             except Exception as e:
                 logger.error(f"{worker_name} error: {e}")
-                self.stats['failed'] += 1
+                self._count('failed')
                 self.results_queue.put({
                     'success': False,
                     'title': task.get('title', 'Unknown'),
@@ -117,29 +169,198 @@ class UploadQueueManager:
                     'task': task
                 })
                 self.upload_queue.task_done()
+                self._notify_stats()
+    
+    def _prepare_product(self, worker_name, task):
+        """Upload a task's images and build its WooCommerce data, None if no image uploaded"""
+        # Upload images first, concurrently; map keeps them in order so the
+        # first image is still the featured one
+        uploaded_images = []
+        results = self.image_executor.map(self.wp_api.upload_media, task['images'])
+        for i, (image_path, result) in enumerate(zip(task['images'], results)):
+            if result['success']:
+                uploaded_images.append(result)
+                logger.info(f"{worker_name}: Uploaded image {i+1}/{len(task['images'])}")
+            else:
+                logger.error(f"{worker_name}: Failed to upload {image_path}")
+                # Continue with other images even if one fails
+        
+        if not uploaded_images:
+            return None
+        
+        # Prepare product data for WooCommerce
+        wc_product_data = {
+            'name': task['title'],
+            'description': task['description'],
+            'type': 'simple',
+            'regular_price': task['price'],
+            'categories': [{'id': task['category_id']}],
+            'sku': task.get('sku', ''),
+            # Upload order is kept, so the first image is the featured one
+            'images': [{'id': img_info['id']} for img_info in uploaded_images]
+        }
+        
+        return wc_product_data
+    
+    def _reupload_rejected_media(self, worker_name, task, wc_product_data, result):
+        """Forget media ids WooCommerce rejected and upload the images again, None if not an image error"""
+        error_text = f"{result.get('error_code', '')} {result.get('error', '')} {result.get('data', '')}"
+        if INVALID_IMAGE_ERROR not in error_text and 'invalid image ID' not in error_text:
+            return None
+        
+        # The message names the rejected id, otherwise drop all of the product's images
+        product_ids = [image['id'] for image in wc_product_data['images']]
+        named_ids = {int(media_id) for media_id in _IMAGE_ID_RE.findall(error_text)}
+        rejected = [media_id for media_id in product_ids if media_id in named_ids] or product_ids
+        
+        logger.warning(f"{worker_name}: media {rejected} no longer exists, re-uploading images")
+        for media_id in rejected:
+            self.wp_api.forget_media(media_id)
+        return self._prepare_product(worker_name, task)
+    
+    def _process_batch_task(self, worker_name, tasks):
+        """Upload images for a group of products, then create them all in one batch request"""
+        ready = []
+        for task in tasks:
+            logger.info(f"{worker_name} processing: {task.get('title', 'Unknown')}")
+            try:
+                wc_product_data = self._prepare_product(worker_name, task)
+            except Exception as e:
+                logger.error(f"{worker_name} error: {e}")
+                self._count('failed')
+                self.results_queue.put({
+                    'success': False,
+                    'title': task.get('title', 'Unknown'),
+                    'error': str(e),
+                    'task': task
+                })
+                continue
+            
+            if wc_product_data is None:
+                self.results_queue.put({
+                    'success': False,
+                    'title': task['title'],
+                    'error': 'No images uploaded successfully',
+                    'task': task
+                })
+                continue
+            ready.append((task, wc_product_data))
+        
+        if not ready:
+            return
+        
+        # One round-trip for the whole group instead of one per product
+        results = self.wc_api.create_products_batch([data for _, data in ready])
+        
+        # Products that referenced deleted media get fresh uploads and one more try
+        retry_items = []
+        for index, ((task, data), result) in enumerate(zip(ready, results)):
+            if not result['success']:
+                fresh_data = self._reupload_rejected_media(worker_name, task, data, result)
+                if fresh_data is not None:
+                    retry_items.append((index, fresh_data))
+        if retry_items:
+            retried = self.wc_api.create_products_batch([data for _, data in retry_items])
+            for (index, _), result in zip(retry_items, retried):
+                results[index] = result
+        
+        for (task, _), result in zip(ready, results):
+            result['task'] = task
+            if result['success']:
+                self._count('completed')
+            else:
+                self._count('failed')
+            self.results_queue.put(result)
+        logger.info(f"{worker_name} completed batch of {len(ready)} products")
     
     def _process_results(self):
         """Process results from uploads (can be overridden for GUI updates)"""
-        while self.running:
-            try:
-                result = self.results_queue.get(timeout=1)
-                if hasattr(self, 'on_upload_complete'):
-                    self.on_upload_complete(result)
+        while True:
+            result = self.results_queue.get()
+            if result is None or not self.running:
                 self.results_queue.task_done()
-            except queue.Empty:
-                continue
+                return
+            
+            # Whatever else has arrived meanwhile is handed over in the same call
+            batch = [result]
+            stopping = False
+            while True:
+                try:
+                    result = self.results_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if result is None:
+                    stopping = True
+                    break
+                batch.append(result)
+            
+            try:
+                self.on_upload_batch_complete(batch)
             except Exception as e:
                 logger.error(f"Results processor error: {e}")
+            for _ in range(len(batch) + stopping):
+                self.results_queue.task_done()
+            if stopping:
+                return
     
     def on_upload_complete(self, result):
         """Callback for upload completion (override in GUI)"""
         # This should be overridden by the GUI
         pass
     
+    def on_upload_batch_complete(self, results):
+        """Callback for results that arrived together, defaults to on_upload_complete per result"""
+        for result in results:
+            self.on_upload_complete(result)
+    
+    def on_stats_changed(self, snapshot):
+        """Callback for queue state changes (override in GUI)"""
+        pass
+    
+    def _count(self, key, amount=1):
+        """Add to one of the upload counters"""
+        with self._stats_lock:
+            self.stats[key] += amount
+    
+    def get_stats_snapshot(self):
+        """Get queue size, active workers and upload counts in one dict"""
+        with self._stats_lock:
+            snapshot = self.stats.copy()
+        snapshot['queue_size'] = self.get_queue_size()
+        snapshot['active_workers'] = self.get_active_workers()
+        return snapshot
+    
+    def _notify_stats(self):
+        """Push a stats snapshot to the listener after a queue state change"""
+        try:
+            self.on_stats_changed(self.get_stats_snapshot())
+        except Exception as e:
+            logger.error(f"Stats listener error: {e}")
+    
     def add_to_queue(self, product_data: Dict[str, Any]):
         """Add a product to the upload queue"""
         self.upload_queue.put(product_data)
-        self.stats['total'] += 1
+        self._ensure_workers()
+        self._count('total')
+        self._notify_stats()
+        return self.upload_queue.qsize()
+    
+    def add_batch_to_queue(self, products, batch_size=20):
+        """Add products that should be created together through the batch endpoint"""
+        count = len(products)
+        if count > LARGE_BATCH_THRESHOLD:
+            # Large imports: fewer, bigger groups amortize the per-request overhead
+            group_size = max(LARGE_BATCH_MIN, -(-count // (os.cpu_count() or 4)))
+            group_size = min(group_size, PRODUCT_BATCH_SIZE)
+        else:
+            # Groups are split across workers and kept small, so image uploads
+            # still run in parallel and results show up while the rest is pending
+            group_size = max(1, min(batch_size, -(-count // self.max_workers)))
+        for start in range(0, len(products), group_size):
+            self.upload_queue.put({'products': products[start:start + group_size]})
+        self._ensure_workers()
+        self._count('total', len(products))
+        self._notify_stats()
         return self.upload_queue.qsize()
     
     def get_queue_size(self):
@@ -148,20 +369,28 @@ class UploadQueueManager:
     
     def get_active_workers(self):
         """Get number of active worker threads"""
-        return sum(1 for w in self.workers if w.is_alive())
+        with self._workers_lock:
+            return sum(1 for w in self.workers if w.is_alive())
     
     def get_stats(self):
         """Get upload statistics"""
-        return self.stats.copy()
+        with self._stats_lock:
+            return self.stats.copy()
     
     def stop(self):
         """Stop all workers"""
         self.running = False
-        for worker in self.workers:
+        with self._workers_lock:
+            workers = list(self.workers)
+        for _ in workers:
+            self.upload_queue.put(None)
+        self.results_queue.put(None)
+        for worker in workers:
             if worker.is_alive():
                 worker.join(timeout=2)
         if self.results_thread.is_alive():
             self.results_thread.join(timeout=2)
+        self.image_executor.shutdown(wait=False, cancel_futures=True)
     
     def wait_for_completion(self, timeout=None):
         """Wait for all tasks to complete"""
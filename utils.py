@@ -1,29 +1,111 @@
 import os
+import time
+import queue
+import atexit
+import random
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import functools
+from collections import defaultdict
 from datetime import datetime
 from typing import List, Dict, Any
 
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tiff'})
+
+REQUIRED_FILES = frozenset({'title.txt', 'description.txt', 'price.txt'})
+
+_DOTENV_LOADED = False
+_LOG_LISTENER = None
+
+
+def load_env():
+    """Load the .env file once per process"""
+    global _DOTENV_LOADED
+    if not _DOTENV_LOADED:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _DOTENV_LOADED = True
+
 
 def setup_logging(log_file='uploader.log'):
-    """Setup logging configuration"""
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
-    )
-
-def validate_image_paths(image_paths):
-    """Validate that image files exist and are accessible"""
-    valid_paths = []
-    for path in image_paths:
-        if os.path.exists(path) and os.path.isfile(path):
-            valid_paths.append(path)
-        else:
-            logging.warning(f"Image not found or inaccessible: {path}")
-    return valid_paths
+    """Setup logging configuration, returns the listener that writes the records"""
+    global _LOG_LISTENER
+    if _LOG_LISTENER is not None:
+        return _LOG_LISTENER
+    
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    
+    # Threads only enqueue records, one listener thread does the file and console I/O
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    # Only merge the message here, the listener's handlers apply the full format
+    queue_handler.setFormatter(logging.Formatter())
+    logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+    _LOG_LISTENER = QueueListener(log_queue, *handlers)
+    _LOG_LISTENER.start()
+    atexit.register(_LOG_LISTENER.stop)
+    return _LOG_LISTENER
+
+def retry(max_attempts=3, base=1.0, cap=16.0, jitter=0.5,
+          retry_exceptions=(ConnectionError, TimeoutError), retry_response=None):
+    """Retry an HTTP call with capped exponential backoff.
+
+    The wrapped function returns a response object; responses whose
+    status code is in RETRYABLE_STATUS_CODES (or for which retry_response
+    returns True, when given) and the given exception types are retried,
+    everything else is returned/raised immediately.
+    """
+    if retry_response is None:
+        retry_response = lambda response: response.status_code in RETRYABLE_STATUS_CODES
+    
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_attempts):
+                last_attempt = attempt == max_attempts - 1
+                try:
+                    response = fn(*args, **kwargs)
+                except retry_exceptions as e:
+                    if last_attempt:
+                        raise
+                    logging.warning(f"{fn.__name__} failed ({e}), retrying")
+                else:
+                    if last_attempt or not retry_response(response):
+                        return response
+                    logging.warning(f"{fn.__name__} got HTTP {response.status_code}, retrying")
+                time.sleep(min(cap, base * 2 ** attempt) + random.uniform(0, jitter))
+        return wrapper
+    return decorator
+
+def is_image_name(name):
+    """Check a file name against IMAGE_EXTENSIONS, lowercasing only the extension"""
+    dot = name.rfind('.')
+    return dot != -1 and name[dot:].lower() in IMAGE_EXTENSIONS
+
+def count_images(products):
+    """Return (total images, products with images) in one pass over the products"""
+    total_images = with_images = 0
+    for product in products:
+        total_images += product.get('image_count', 0)
+        if product.get('has_images'):
+            with_images += 1
+    return total_images, with_images
+
+class _PriceDeleteTable(dict):
+    """str.translate table dropping every char except digits and '.', filled lazily"""
+    def __missing__(self, codepoint):
+        ch = chr(codepoint)
+        # Same characters the old r'[^\d.]' regex kept
+        value = codepoint if ch == '.' or ch.isdecimal() else None
+        self[codepoint] = value
+        return value
+
+PRICE_DELETE_TABLE = _PriceDeleteTable()
 
 def format_price(price_str):
     """Format price string to WooCommerce format"""
@@ -33,46 +115,46 @@ def format_price(price_str):
     except (ValueError, TypeError):
         return "0"
 
-def build_category_tree(categories):
-    """Build hierarchical category tree from flat list"""
-    category_dict = {}
+def build_category_tree(categories, build_nodes=False):
+    """Build the indented display list and a display name -> id dict from a flat list
+    
+    With build_nodes the nested tree ({'display', 'id', 'children'} nodes) is
+    returned as well, otherwise the third value is None.
+    """
     category_list = []
+    category_ids = {}
+    tree = [] if build_nodes else None
     
-    # First pass: store all categories by ID
+    # Index children by parent once instead of rescanning per node
+    children = defaultdict(list)
     for cat in categories:
-        category_dict[cat['id']] = cat
-    
-    # Build tree
-    def build_tree(parent_id=0, level=0):
-        tree = []
-        for cat in categories:
-            if cat['parent'] == parent_id:
-                indent = "  " * level
-                display_name = f"{indent}{cat['name']} (ID: {cat['id']})"
-                tree.append({
-                    'display': display_name,
-                    'id': cat['id'],
-                    'children': build_tree(cat['id'], level + 1)
-                })
-        return tree
-    
-    # Flatten tree for display
-    def flatten_tree(tree, result_list):
-        for item in tree:
-            result_list.append(item['display'])
-            flatten_tree(item['children'], result_list)
+        children[cat['parent']].append(cat)
     
-    tree = build_tree()
-    flatten_tree(tree, category_list)
+    # Depth-first walk, nodes come off the stack in display order
+    stack = [(cat, 0, tree) for cat in reversed(children[0])]
+    seen = set()
+    while stack:
+        cat, level, siblings = stack.pop()
+        if cat['id'] in seen:
+            continue
+        seen.add(cat['id'])
+        
+        indent = "  " * level
+        display_name = f"{indent}{cat['name']} (ID: {cat['id']})"
+        category_list.append(display_name)
+        category_ids[display_name] = cat['id']
+        node_children = None
+        if build_nodes:
+            node = {'display': display_name, 'id': cat['id'], 'children': []}
+            siblings.append(node)
+            node_children = node['children']
+        stack.extend((child, level + 1, node_children) for child in reversed(children[cat['id']]))
     
-    return category_list, tree
+    return category_list, category_ids, tree
 
 
 def validate_bulk_directory(directory_path: str) -> Dict[str, Any]:
     """Validate a bulk upload directory structure"""
-    import os
-    from pathlib import Path
-    
     validation_result = {
         'valid': False,
         'errors': [],
@@ -82,33 +164,31 @@ def validate_bulk_directory(directory_path: str) -> Dict[str, Any]:
     }
     
     try:
-        path = Path(directory_path)
-        
         # Check if directory exists
-        if not path.exists():
+        if not os.path.exists(directory_path):
             validation_result['errors'].append(f"Directory does not exist: {directory_path}")
             return validation_result
         
-        if not path.is_dir():
+        if not os.path.isdir(directory_path):
             validation_result['errors'].append(f"Path is not a directory: {directory_path}")
             return validation_result
         
         # Check directory structure
         product_folders = []
-        for item in path.iterdir():
-            if item.is_dir():
-                # Check if it's a product folder (has required files)
-                required_files_exist = all(
-                    (item / file).exists()
-                    for file in ['title.txt', 'description.txt', 'price.txt']
-                )
-                
-                if required_files_exist:
-                    product_folders.append(item.name)
-                else:
-                    validation_result['warnings'].append(
-                        f"Folder '{item.name}' missing required files"
-                    )
+        with os.scandir(directory_path) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    # Check if it's a product folder (has required files), one listing per folder;
+                    # lower-cased because Windows file names are case-insensitive
+                    with os.scandir(entry.path) as sub_entries:
+                        names = {sub.name.lower() for sub in sub_entries if sub.is_file()}
+                    
+                    if REQUIRED_FILES.issubset(names):
+                        product_folders.append(entry.name)
+                    else:
+                        validation_result['warnings'].append(
+                            f"Folder '{entry.name}' missing required files"
+                        )
         
         if not product_folders:
             validation_result['errors'].append("No valid product folders found")
@@ -146,8 +226,18 @@ def create_batch_log(batch_id: str, products: List[Dict[str, Any]], category_id:
     }
     
     try:
-        with open(log_file, 'w', encoding='utf-8') as f:
-            json.dump(log_data, f, indent=2, ensure_ascii=False)
+        try:
+            import orjson
+        except ImportError:
+            orjson = None
+        
+        if orjson is not None:
+            # orjson writes UTF-8 bytes directly and pretty-prints much faster
+            with open(log_file, 'wb') as f:
+                f.write(orjson.dumps(log_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        else:
+            with open(log_file, 'w', encoding='utf-8') as f:
+                json.dump(log_data, f, indent=2, ensure_ascii=False)
         
         return log_file
     except Exception as e:
@@ -156,6 +246,10 @@ def create_batch_log(batch_id: str, products: List[Dict[str, Any]], category_id:
 
 def format_bulk_stats(stats: Dict[str, Any]) -> str:
     """Format bulk upload statistics for display"""
+    # Stats from validate_products/read_excel_file already carry the total
+    total_images = stats.get('total_images')
+    if total_images is None:
+        total_images, _ = count_images(stats.get('products', []))
     return f"""
 📊 BATCH STATISTICS
 ────────────────────────────────────
@@ -165,6 +259,6 @@ Total Products: {stats.get('total', 0)}
 🖼️ With Images: {stats.get('with_images', 0)}
 ⚠️ Without Images: {stats.get('without_images', 0)}
 
-Total Images: {sum(p.get('image_count', 0) for p in stats.get('products', []))}
+Total Images: {total_images}
 ────────────────────────────────────
 """
\ No newline at end of file